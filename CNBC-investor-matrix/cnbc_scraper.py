@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+"""
+Reusable version of 1_Webscrape_Data_From_CNBC.ipynb: scrape a CNBC list article (e.g. the yearly Disruptor 50)
+and every company page it links to into one DataFrame.
+* Pages are fetched concurrently through one pooled session, politely: requests to the same host are spaced
+  by a per-host rate limit, and 429/5xx responses are retried with backoff (honoring Retry-After)
+* Every page is downloaded once and kept in a content-addressed cache (pages/objects/<sha256>.html plus an
+  append-only url index), so re-runs and re-parses never download it again
+* Company pages are parsed in parallel processes, and the DataFrame is built from the parsed records in one go
+
+INPUT:
+    URL of a CNBC list article with a table of companies
+OUTPUT FORMAT:
+    CSV with company, cnbc_link, cnbc_sum and one column per field of the company pages
+USAGE:
+    python cnbc_scraper.py [URL] [--output PATH] [--cache-dir DIR] [--workers N] [--rate R] [--refresh]
+                           [--parse-workers N]
+
+    URL               List article (default: the 2020 Disruptor 50)
+    --output          CSV file written (default: output/cnbc_50_webscraped_list.csv)
+    --cache-dir       Page cache directory (default: pages)
+    --workers         Maximum number of concurrent downloads (default: 8)
+    --rate            Maximum requests per second to one host (default: 1.0)
+    --refresh         Download every page again and update the cache
+    --parse-workers   Processes parsing company pages (default: one per CPU, 1 parses in this process)
+
+    From a notebook:
+        from cnbc_scraper import scrape
+        df = scrape('https://www.cnbc.com/2020/06/16/meet-the-2020-cnbc-disruptor-50-companies.html')
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urljoin, urlsplit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import pandas as pd
+from bs4 import BeautifulSoup
+
+disruptor_50_2020 = 'https://www.cnbc.com/2020/06/16/meet-the-2020-cnbc-disruptor-50-companies.html'
+
+class PageCache:
+    '''
+    Content-addressed cache of downloaded pages.
+    * Each page body is stored once under objects/<first 2 hex digits>/<sha256>.html, so identical pages
+      share one file and a body can be checked against its name
+    * index.jsonl maps urls to digests, one appended line per download (the last line of a url wins)
+    * Object files are written before the index line that refers to them, so a crash never leaves the index
+      pointing at a missing page
+
+    Parameters
+    ------------
+    cache_dir : str, default='pages'
+        Directory of the cache.
+    '''
+    def __init__(self, cache_dir='pages'):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.jsonl')
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self.index = {}
+        try:
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Line cut short by a crash
+                        continue
+                    self.index[record['url']] = record
+        except FileNotFoundError:
+            pass
+
+    def path(self, digest):
+        return os.path.join(self.cache_dir, 'objects', digest[:2], digest+'.html')
+
+    def get(self, url):
+        '''
+        Return the cached body of url as bytes, or None if it was never downloaded.
+        '''
+        record = self.index.get(url)
+        if record is None:
+            return None
+        try:
+            with open(self.path(record['sha256']), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, body):
+        '''
+        Store the body (bytes) downloaded from url and return its sha256 digest.
+        '''
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temporary name, so two threads storing the same page never write the same file
+            tmp = '{}.{}.tmp'.format(path, threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, path)
+        record = {'url':url, 'sha256':digest, 'bytes':len(body), 'fetched':time.time()}
+        with self._lock, open(self.index_path, 'a') as f:
+            f.write(json.dumps(record)+'\n')
+            self.index[url] = record
+        return digest
+
+class HostLimiter:
+    '''
+    Spaces out requests to the same host: at most `rate` request starts per second per host, whatever the
+    number of threads. Different hosts do not wait on each other.
+
+    Parameters
+    ------------
+    rate : float, default=1.0
+        Requests per second allowed to one host.
+    '''
+    def __init__(self, rate=1.0):
+        self.interval = 1/rate
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        '''
+        Block until a request to url's host may start.
+        '''
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start+self.interval
+        if start > now:
+            time.sleep(start-now)
+
+def make_session(workers=8, retries=3):
+    '''
+    Return a requests.Session with a pool of `workers` connections per host and backoff on 429/5xx responses.
+    '''
+    retry = Retry(total=retries, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504],
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'User-Agent':'Mozilla/5.0 (compatible; pledge1-research-scraper)',
+                            'Accept-Encoding':'gzip, deflate'})
+    return session
+
+def fetch_pages(urls, cache, workers=8, rate=1.0, refresh=False, timeout=30, session=None):
+    '''
+    Download pages concurrently, going through the page cache.
+
+    Parameters
+    ------------
+    urls : list
+        Page urls. Duplicates are downloaded once.
+    cache : PageCache
+        Cache consulted before, and updated after, every download.
+    workers : int, default=8
+        Maximum number of concurrent downloads.
+    rate : float, default=1.0
+        Maximum requests per second to one host.
+    refresh : bool, default=False
+        Download cached pages again.
+    timeout : float, default=30
+        Timeout of each request in seconds.
+    session : requests.Session, optional
+        Session to use instead of make_session(workers).
+
+    Return
+    ------------
+    pages : list
+        Page bodies as bytes, in the order of urls. None for pages that could not be downloaded.
+    '''
+    pages = {}
+    todo = []
+    for url in dict.fromkeys(urls):
+        body = None if refresh else cache.get(url)
+        if body is None:
+            todo.append(url)
+        else:
+            pages[url] = body
+    print('FETCHING {} PAGES ({} CACHED)'.format(len(pages)+len(todo), len(pages)))
+    if todo:
+        session = session or make_session(workers)
+        limiter = HostLimiter(rate)
+        def fetch(url):
+            limiter.wait(url)
+            try:
+                r = session.get(url, timeout=timeout)
+            except requests.RequestException as e:
+                return url, None, '{}: {}'.format(type(e).__name__, e)
+            if r.status_code != 200:
+                return url, None, 'HTTP {}'.format(r.status_code)
+            cache.put(url, r.content)
+            return url, r.content, None
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for url, body, error in executor.map(fetch, todo):
+                if error is not None:
+                    print('[Could not fetch {}: {}]'.format(url, error))
+                pages[url] = body
+    return [pages[url] for url in urls]
+
+def parse_list(html, base_url=None):
+    '''
+    Return the companies in the table of a list article, as dicts of company, cnbc_link and cnbc_sum.
+    Rows without company cells (headers) are skipped; relative links are resolved against base_url.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    rows = []
+    for tr in soup.find_all('tr'):
+        cells = tr.find_all('td', attrs={'class':'BasicTable-textData'})
+        link = cells[0].find('a') if cells else None
+        if link is None:
+            continue
+        rows.append({'company':link.get_text(),
+                     'cnbc_link':urljoin(base_url, link.attrs['href']) if base_url else link.attrs['href'],
+                     'cnbc_sum':cells[1].get_text() if len(cells) > 1 else None})
+    return rows
+
+def parse_company(html):
+    '''
+    Return the bolded 'Key: value' fields of a company page (Founded, Headquarters, Investors, ...) as a dict.
+    * Fields come from the first paragraph of the first div.group, as in the notebook
+    * Returns an empty dict for missing pages or pages without that paragraph
+    '''
+    if html is None:
+        return {}
+    soup = BeautifulSoup(html, 'html.parser')
+    group = soup.find('div', {'class':'group'})
+    if group is None or group.p is None:
+        return {}
+    fields = {}
+    for element in group.p.find_all('strong'):
+        value = element.next_sibling
+        # Only text right after the label is a value
+        if not isinstance(value, str):
+            continue
+        key = element.get_text().strip('[: \xa0]')
+        if key:
+            fields[key] = value.strip('[ \xa0(]')
+    return fields
+
+def parse_pages(pages, workers=None):
+    '''
+    Parse company pages with parse_company, in `workers` processes (one per CPU by default).
+    workers=1 parses in this process.
+    '''
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pages) < 2:
+        return [parse_company(page) for page in pages]
+    with ProcessPoolExecutor(max_workers=min(workers, len(pages))) as executor:
+        return list(executor.map(parse_company, pages, chunksize=max(1, len(pages)//(4*workers))))
+
+def scrape(url=disruptor_50_2020, cache_dir='pages', workers=8, rate=1.0, refresh=False, parse_workers=None):
+    '''
+    Scrape a CNBC list article and the page of every company it lists.
+
+    Parameters
+    ------------
+    url : str, default=disruptor_50_2020
+        List article.
+    cache_dir : str, default='pages'
+        Page cache directory (see PageCache).
+    workers : int, default=8
+        Maximum number of concurrent downloads.
+    rate : float, default=1.0
+        Maximum requests per second to one host.
+    refresh : bool, default=False
+        Download every page again and update the cache.
+    parse_workers : int, optional
+        Processes parsing company pages (see parse_pages).
+
+    Return
+    ------------
+    df : pandas.core.frame.DataFrame
+        One row per company: company, cnbc_link, cnbc_sum and the fields of its page, in order of first appearance.
+        Fields missing from a page are NaN.
+    '''
+    cache = PageCache(cache_dir)
+    session = make_session(workers)
+    [listing] = fetch_pages([url], cache, workers=workers, rate=rate, refresh=refresh, session=session)
+    if listing is None:
+        raise RuntimeError('could not fetch the list article {}'.format(url))
+    rows = parse_list(listing, base_url=url)
+    print('FOUND {} COMPANIES'.format(len(rows)))
+    pages = fetch_pages([row['cnbc_link'] for row in rows], cache, workers=workers, rate=rate, refresh=refresh,
+                        session=session)
+    details = parse_pages(pages, workers=parse_workers)
+    # Build the frame once from complete records
+    return pd.DataFrame([{**row, **fields} for row, fields in zip(rows, details)])
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='cnbc_scraper', description='Scrape a CNBC list article and its company pages.')
+    parser.add_argument('url', nargs='?', default=disruptor_50_2020, help='list article url')
+    parser.add_argument('--output', default='output/cnbc_50_webscraped_list.csv', help='CSV file written')
+    parser.add_argument('--cache-dir', default='pages', help='page cache directory')
+    parser.add_argument('--workers', type=int, default=8, help='maximum number of concurrent downloads')
+    parser.add_argument('--rate', type=float, default=1.0, help='maximum requests per second to one host')
+    parser.add_argument('--refresh', action='store_true', help='download every page again and update the cache')
+    parser.add_argument('--parse-workers', type=int, default=None, help='processes parsing company pages')
+    args = parser.parse_args(argv)
+    if args.rate <= 0:
+        parser.error('--rate must be positive')
+    return args
+
+def main():
+    """main
+    """
+    args = parse_args(sys.argv[1:])
+    start = time.perf_counter()
+    df = scrape(args.url, cache_dir=args.cache_dir, workers=args.workers, rate=args.rate, refresh=args.refresh,
+                parse_workers=args.parse_workers)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    df.to_csv(args.output, index=False)
+    print('{} COMPANIES WRITTEN TO {} IN {:.1f}s'.format(len(df), args.output, time.perf_counter()-start))
+
+if __name__ == "__main__":
+    main()
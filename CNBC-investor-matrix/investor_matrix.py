@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def investor_matrix(df, company_col='company', investors_col='Investors', sep='; '):
+    '''
+    Build a sparse company x investor indicator matrix from a column of delimited investor lists.
+    * Parses every row in one vectorized pass: split, explode, factorize
+    * Missing and empty investor entries are skipped; duplicates within a row count once
+
+    Parameters
+    ------------
+    df : pandas.core.frame.DataFrame
+        One row per company, e.g. input/cnbc_50_p1_sfdc.csv.
+    company_col : str, default='company'
+        Column of company names.
+    investors_col : str, default='Investors'
+        Column of investor lists, e.g. 'Accel; Index Ventures; Sequoia Capital'.
+    sep : str, default='; '
+        Separator between investors.
+
+    Return
+    ------------
+    matrix : pandas.core.frame.DataFrame
+        Sparse 0/1 DataFrame indexed by company, with one column per investor sorted by name.
+    '''
+    # One (row number, investor) pair per listed investor
+    investors = df[investors_col].reset_index(drop=True).str.split(sep).explode().str.strip()
+    investors = investors[investors.notna() & (investors != '')]
+    rows = investors.index.to_numpy()
+    # Investor columns sorted by name, like the notebook's Unique_Investor_List
+    cols, names = pd.factorize(investors.to_numpy(), sort=True)
+    m = sparse.csr_matrix((np.ones(len(cols), dtype=np.int8), (rows, cols)), shape=(len(df), len(names)))
+    # Collapse duplicate investors within a row to 1
+    m.data[:] = 1
+    return pd.DataFrame.sparse.from_spmatrix(m, index=pd.Index(df[company_col].to_numpy(), name=company_col),
+                                             columns=names)
+
+def investor_totals(matrix):
+    '''
+    Return the number of companies each investor backs, highest first.
+    '''
+    totals = pd.Series(np.asarray(matrix.sparse.to_coo().sum(axis=0)).ravel(), index=matrix.columns, name='Counts')
+    return totals.sort_values(ascending=False, kind='stable')
+
+def company_totals(matrix):
+    '''
+    Return the number of investors of each company.
+    '''
+    return pd.Series(np.asarray(matrix.sparse.to_coo().sum(axis=1)).ravel(), index=matrix.index, name='Total')
+
+def top_investors(matrix, min_count=3):
+    '''
+    Return the investors that back at least min_count companies, as a 'VC Firm', 'Counts' DataFrame.
+    * The notebook keeps VCs with more than 2 hits, i.e. min_count=3
+    '''
+    totals = investor_totals(matrix)
+    totals = totals[totals >= min_count]
+    return totals.rename_axis('VC Firm').reset_index()
+
+def top_investor_matrix(matrix, min_count=3):
+    '''
+    Return a dense company x investor matrix of the top investors, with a 'Total' column per company.
+    '''
+    top = matrix[top_investors(matrix, min_count)['VC Firm'].to_list()].sparse.to_dense().astype(int)
+    top['Total'] = top.sum(axis=1)
+    return top.reset_index()
+
+def co_investor_matrix(matrix):
+    '''
+    Return a sparse company x company matrix counting the investors each pair of companies shares.
+    * The diagonal holds each company's number of investors
+    '''
+    m = matrix.sparse.to_coo().tocsr().astype(np.int32)
+    return pd.DataFrame.sparse.from_spmatrix(m @ m.T, index=matrix.index, columns=matrix.index)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+"""
+Offline benchmarks for p1_crunchbase and company_mapper.
+No benchmark calls the Crunchbase API or spends API quota.
+
+USAGE:
+    python benchmarks.py pagination [--rows 25000 50000 100000 200000] [--page-size 1000]
+    python benchmarks.py board-strings [--companies 10000] [--affiliations 200000] [--skip-legacy]
+    python benchmarks.py memory [--companies 10000] [--affiliations 200000]
+    python benchmarks.py parse [--rows 100000] [--page-size 1000]
+    python benchmarks.py e2e [--companies 10 1000 10000] [--latency 0.0] [--page-size 1000] [--throttle-rate 0.0]
+    python benchmarks.py startup [--runs 20]
+"""
+import sys
+import json
+import time
+import types
+import importlib.util
+import argparse
+import tempfile
+import subprocess
+
+def offline():
+    '''
+    Let p1_crunchbase run without a user_key.py and turn off its response cache.
+    '''
+    if importlib.util.find_spec('user_key') is None:
+        sys.modules['user_key'] = types.SimpleNamespace(userkey={'user_key':'offline'})
+    import p1_crunchbase
+    p1_crunchbase.cache.bypass = True
+    return p1_crunchbase
+
+def synthetic_jobs(n, companies=1000):
+    '''
+    Return n synthetic jobs search entities, shaped like Crunchbase responses to makequery_board_affiliations.
+    '''
+    job_types = ['board_member','advisor','board_observer']
+    entities = []
+    for i in range(n):
+        org, person = i % companies, i // 3
+        entities.append({'uuid':'job-{:08d}'.format(i),
+                         'properties':{'identifier':{'uuid':'job-{:08d}'.format(i),'value':'Job {}'.format(i),'entity_def_id':'job'},
+                                       'organization_identifier':{'uuid':'org-{:06d}'.format(org),'value':'Company {}'.format(org)},
+                                       'person_identifier':{'uuid':'person-{:08d}'.format(person),'value':'Person {}'.format(person)},
+                                       'job_type':job_types[i % 3],
+                                       'is_current':bool(i % 2),
+                                       'title':'Board Member'}})
+    return entities
+
+def paged_responses(entities, page_size):
+    '''
+    Return a stand-in for p1_crunchbase.api_request that serves entities page by page, following after_id.
+    '''
+    bodies = {}
+    for start in range(0, len(entities), page_size):
+        after_id = entities[start-1]['uuid'] if start else None
+        bodies[after_id] = json.dumps({'count':len(entities),'entities':entities[start:start+page_size]})
+    def api_request(endpoint, params=None, query=None, raw=False, fresh=False):
+        return bodies.get((query or {}).get('after_id'), json.dumps({'count':len(entities),'entities':[]}))
+    return api_request
+
+def bench_pagination(args):
+    '''
+    Time go_past_1000 against the previous append-per-page accumulation at increasing result sizes.
+    * go_past_1000 should scale linearly: seconds per 100k rows stays flat as rows grow
+    '''
+    p1 = offline()
+    import pandas as pd
+    from p1_queries import makequery_board_affiliations
+    print('{:>10} {:>12} {:>14} {:>12} {:>14}'.format('rows','concat once','s / 100k rows','per page','s / 100k rows'))
+    for rows in args.rows:
+        p1.api_request = paged_responses(synthetic_jobs(rows), args.page_size)
+        query = makequery_board_affiliations(['org'], limit=args.page_size)
+        # Current implementation: collect pages, concatenate once
+        start = time.perf_counter()
+        raw = p1.go_past_1000(query, 'jobs', rows, pd.DataFrame())
+        linear = time.perf_counter()-start
+        assert len(raw) == rows
+        # Previous implementation: grow the accumulated DataFrame on every page
+        start = time.perf_counter()
+        raw = pd.DataFrame()
+        while len(raw) < rows:
+            if len(raw):
+                query['after_id'] = raw.uuid.iloc[-1]
+            raw = p1.url_extraction(query, 'jobs', raw)
+        query.pop('after_id', None)
+        quadratic = time.perf_counter()-start
+        print('{:>10} {:>12.2f} {:>14.2f} {:>12.2f} {:>14.2f}'.format(rows, linear, linear*1e5/rows,
+                                                                     quadratic, quadratic*1e5/rows))
+
+def synthetic_affiliations(companies, affiliations, seed=0):
+    '''
+    Return a column_mapper-renamed affiliations frame like `aff` in company_mapper, with primary_org added.
+    '''
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    people = max(1, affiliations//3)
+    person = rng.integers(0, people, affiliations)
+    orgs = np.array(['Org {}'.format(i) if i % 5 else 'Org, Inc. {}'.format(i) for i in range(people)], dtype=object)
+    primary_org = pd.Series(orgs[person]).where(person % 7 != 0)
+    return pd.DataFrame({'company':['Company {}'.format(i) for i in rng.integers(0, companies, affiliations)],
+                         'person':['Person {}'.format(i) for i in person],
+                         'person_uuid':['person-{:08d}'.format(i) for i in person],
+                         'job_type':rng.choice(['board_member','advisor','board_observer'], affiliations),
+                         'is_current':pd.Series(rng.choice([True, False, None], affiliations), dtype=object),
+                         'primary_org':primary_org})
+
+def legacy_create_board_strings(lst_of_frames, company_names):
+    '''
+    create_board_strings before it was vectorized: filters every frame once per company.
+    '''
+    import pandas as pd
+    all_dict = []
+    for df in lst_of_frames:
+        people_dict = {}
+        for org in company_names:
+            temp_df = df[df['company']==org]
+            names = temp_df['person'].to_list()
+            companies = temp_df['primary_org'].to_list()
+            board_string = ''
+            if names != []:
+                board_info = dict(zip(names, companies))
+                for name, company in sorted(board_info.items()):
+                    if pd.isna(company):
+                        board_string += name +'; '
+                    else:
+                        board_string += name+' ('+company+'); '
+                board_string = board_string[:-2].replace(',', '')
+            people_dict[org] = board_string
+        all_dict.append(people_dict)
+    return all_dict
+
+def bench_board_strings(args):
+    '''
+    Time create_board_strings against the per-company filtering it replaced, and check both give identical output.
+    '''
+    p1 = offline()
+    from company_mapper import board_frames
+    aff = synthetic_affiliations(args.companies, args.affiliations)
+    frames = board_frames(aff)
+    company_names = sorted(set(aff['company']))
+    start = time.perf_counter()
+    result = p1.create_board_strings(frames, company_names)
+    print('create_board_strings: {:.2f} s for {} companies x {} affiliations'.format(time.perf_counter()-start,
+                                                                                    len(company_names), len(aff)))
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        expected = legacy_create_board_strings(frames, company_names)
+        print('per-company filtering: {:.2f} s'.format(time.perf_counter()-start))
+        assert result == expected, 'create_board_strings output differs from the per-company implementation'
+        print('outputs identical')
+
+def synthetic_investments(companies, investments, seed=0):
+    '''
+    Return an investments frame like the output of company_mapper.investments.
+    '''
+    import numpy as np
+    import pandas as pd
+    from p1_crunchbase import order
+    rng = np.random.default_rng(seed)
+    company = rng.integers(0, companies, investments)
+    investor = rng.integers(0, max(1, investments//20), investments)
+    partner = rng.integers(0, max(1, investments//10), investments)
+    return pd.DataFrame({'investor_uuid':['investor-{:08d}'.format(i) for i in investor],
+                         'investor_name':['Investor {}'.format(i) for i in investor],
+                         'company':['Company {}'.format(i) for i in company],
+                         'company_uuid':['org-{:06d}'.format(i) for i in company],
+                         'type':rng.choice(order, investments),
+                         'partner_uuid':['person-{:08d}'.format(i) for i in partner],
+                         'partner_name':['Person {}'.format(i) for i in partner]})
+
+def bench_memory(args):
+    '''
+    Compare the deep memory usage of affiliations and investments frames before and after compact_frame,
+    and check that the board and investor strings built from both are identical.
+    '''
+    p1 = offline()
+    from p1_schema import compact_frame
+    from company_mapper import board_frames
+    aff = synthetic_affiliations(args.companies, args.affiliations)
+    aff['uuid'] = ['job-{:08d}'.format(i) for i in range(len(aff))]
+    aff['title'] = 'Board Member'
+    investors = synthetic_investments(args.companies, args.affiliations)
+    print('{:>14} {:>12} {:>12} {:>8}'.format('frame','object MB','compact MB','ratio'))
+    for name, frame in [('affiliations', aff), ('investments', investors)]:
+        compact = compact_frame(frame)
+        before = frame.memory_usage(deep=True).sum()/1e6
+        after = compact.memory_usage(deep=True).sum()/1e6
+        print('{:>14} {:>12.1f} {:>12.1f} {:>7.1f}x'.format(name, before, after, before/after))
+    # Downstream output must not change
+    company_names = sorted(set(aff['company']))
+    compact_aff = compact_frame(aff)
+    assert p1.create_board_strings(board_frames(aff), company_names) == \
+        p1.create_board_strings(board_frames(compact_aff), company_names), 'board strings differ'
+    assert p1.create_investor_strings(investors) == p1.create_investor_strings(compact_frame(investors)), 'investor strings differ'
+    print('board and investor strings identical')
+
+def synthetic_investment_entities(n, companies=1000):
+    '''
+    Return n synthetic investments search entities, shaped like Crunchbase responses to makequery_investors.
+    '''
+    rounds = ['Seed Round','Series A','Series B','Venture Round']
+    entities = []
+    for i in range(n):
+        org, investor = i % companies, i // 7
+        company = 'Company {}'.format(org)
+        entities.append({'uuid':'investment-{:08d}'.format(i),
+                         'properties':{'identifier':{'uuid':'investment-{:08d}'.format(i),
+                                                     'value':'Investor {} investment in {} - {}'.format(investor, rounds[i % 4], company),
+                                                     'permalink':'investment-{:08d}'.format(i),'entity_def_id':'investment',
+                                                     'image_id':'image-{}'.format(investor)},
+                                       'name':'Investor {} investment in {}'.format(investor, company),
+                                       'organization_identifier':{'uuid':'org-{:06d}'.format(org),'value':company,
+                                                                  'permalink':'company-{}'.format(org),
+                                                                  'entity_def_id':'organization','image_id':'image'},
+                                       'investor_identifier':{'uuid':'investor-{:08d}'.format(investor),
+                                                              'value':'Investor {}'.format(investor),
+                                                              'permalink':'investor-{}'.format(investor),
+                                                              'entity_def_id':'organization','image_id':'image'},
+                                       'partner_identifiers':[{'uuid':'person-{:08d}'.format(i),'value':'Person {}'.format(i),
+                                                               'permalink':'person-{}'.format(i),'entity_def_id':'person'}]
+                                                              if i % 3 == 0 else None,
+                                       'updated_at':'2021-01-01T00:00:00Z'}})
+    return entities
+
+def bench_parse(args):
+    '''
+    Time page parsing: json.loads on text + json_normalize against fetch_page's projected decoding of the raw bytes,
+    and check that the projected columns hold the same values.
+    '''
+    p1 = offline()
+    import pandas as pd
+    from pandas import json_normalize
+    entities = synthetic_investment_entities(args.rows)
+    bodies = [json.dumps({'count':len(entities),'entities':entities[start:start+args.page_size]}).encode('utf-8')
+              for start in range(0, len(entities), args.page_size)]
+    print('JSON backend: {}'.format(p1.loads.__module__))
+    # Previous path: bytes -> str -> dicts -> every nested field flattened
+    start = time.perf_counter()
+    normalized = pd.concat([json_normalize(json.loads(body.decode('utf-8'))['entities']) for body in bodies], ignore_index=True)
+    legacy = time.perf_counter()-start
+    # Projected path, as fetch_page runs it
+    columns = p1.projections['investments']
+    start = time.perf_counter()
+    projected = pd.concat([p1.project(p1.loads(body)['entities'], columns) for body in bodies], ignore_index=True)
+    fast = time.perf_counter()-start
+    print('{:>24} {:>10} {:>10}'.format('', 'seconds', 'columns'))
+    print('{:>24} {:>10.2f} {:>10}'.format('json.loads + normalize', legacy, normalized.shape[1]))
+    print('{:>24} {:>10.2f} {:>10}'.format('projected', fast, projected.shape[1]))
+    for col in columns:
+        if col in normalized.columns:
+            assert normalized[col].astype(object).where(normalized[col].notna(), None).tolist() == \
+                projected[col].astype(object).where(projected[col].notna(), None).tolist(), col
+    print('projected columns identical ({:.1f}x faster)'.format(legacy/fast))
+
+# Runs company_mapper in a child process against the mock server, then prints its wall time and peak memory
+e2e_runner = '''
+import sys, json, time, types, tracemalloc
+sys.modules.setdefault('user_key', types.SimpleNamespace(userkey={'user_key':'offline'}))
+sys.path.insert(0, sys.argv[1])
+tracemalloc.start()
+start = time.perf_counter()
+import p1_crunchbase
+p1_crunchbase.client.base_url = sys.argv[2]
+import company_mapper
+sys.argv = ['company_mapper']+sys.argv[3:]
+company_mapper.main()
+print(json.dumps({'seconds':time.perf_counter()-start, 'peak':tracemalloc.get_traced_memory()[1]}))
+'''
+
+def bench_e2e(args):
+    '''
+    Run company_mapper end to end against a local mock Crunchbase server, for portfolios of increasing size.
+    * Reports wall time, API calls (and how many were throttled), bytes received and peak traced memory
+    * Each run starts from empty caches, in its own process and directory
+    '''
+    import os
+    from mock_crunchbase import MockCrunchbase, SyntheticData
+    here = os.path.dirname(os.path.abspath(__file__))
+    data = SyntheticData(max(args.companies))
+    print('{:>9} {:>9} {:>7} {:>10} {:>10} {:>10}'.format('companies','seconds','calls','throttled','MB recv','peak MB'))
+    with MockCrunchbase(data, latency=args.latency, page_size=args.page_size, throttle_rate=args.throttle_rate) as mock:
+        for companies in args.companies:
+            mock.reset_counters()
+            with tempfile.TemporaryDirectory() as run_dir:
+                with open(os.path.join(run_dir, 'input.txt'), 'w') as f:
+                    f.write('\n'.join('Company {}'.format(i) for i in range(companies)))
+                mapper_args = [arg for arg in args.mapper_args if arg != '--']
+                cmd = [sys.executable, '-c', e2e_runner, here, mock.base_url, 'input.txt', 'False', '--no-cache',
+                       '--calls-per-minute', str(args.calls_per_minute), *mapper_args]
+                run = subprocess.run(cmd, cwd=run_dir, capture_output=True, text=True)
+                if run.returncode != 0:
+                    sys.exit(run.stderr)
+                stats = json.loads(run.stdout.strip().splitlines()[-1])
+            calls = mock.counters()
+            print('{:>9} {:>9.2f} {:>7} {:>10} {:>10.2f} {:>10.1f}'.format(companies, stats['seconds'], calls['requests'],
+                  calls['throttled'], calls['bytes']/1e6, stats['peak']/1e6))
+            if args.verbose:
+                print('          calls by endpoint: {}'.format(calls['by_endpoint']))
+
+def bench_startup(args):
+    '''
+    Time fresh company_mapper processes that exit before any API call, as when it is invoked per company.
+    * `python -c pass` is the interpreter's own startup, for reference
+    * Reports which heavy modules each command loaded (the CLI should load none of them for --help)
+    '''
+    import os
+    import statistics
+    here = os.path.dirname(os.path.abspath(__file__))
+    heavy = ['pandas', 'numpy', 'requests', 'user_key']
+    loaded = "import sys; print(' '.join(m for m in {} if m in sys.modules))".format(heavy)
+    commands = [('python -c pass', ['-c', 'pass']),
+                ('import company_mapper', ['-c', 'import company_mapper; '+loaded]),
+                ('company_mapper --help', ['-m', 'company_mapper', '--help']),
+                ('missing arguments', ['-m', 'company_mapper'])]
+    print('{:<24} {:>9} {:>9} {:>9}  {}'.format('command', 'min ms', 'median ms', 'max ms', 'heavy modules loaded'))
+    for name, command in commands:
+        seconds = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run = subprocess.run([sys.executable, *command], cwd=here, capture_output=True, text=True)
+            seconds.append(time.perf_counter()-start)
+        modules = run.stdout.strip() if command[-1].endswith(loaded) else '-'
+        print('{:<24} {:>9.1f} {:>9.1f} {:>9.1f}  {}'.format(name, 1000*min(seconds), 1000*statistics.median(seconds),
+              1000*max(seconds), modules or 'none'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for p1_crunchbase and company_mapper.')
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+    pagination = sub.add_parser('pagination', help='go_past_1000 scaling on synthetic jobs results')
+    pagination.add_argument('--rows', type=int, nargs='+', default=[25000, 50000, 100000, 200000])
+    pagination.add_argument('--page-size', type=int, default=1000)
+    pagination.set_defaults(func=bench_pagination)
+    board_strings = sub.add_parser('board-strings', help='create_board_strings on synthetic affiliations')
+    board_strings.add_argument('--companies', type=int, default=10000)
+    board_strings.add_argument('--affiliations', type=int, default=200000)
+    board_strings.add_argument('--skip-legacy', action='store_true', help='skip the slow per-company implementation')
+    board_strings.set_defaults(func=bench_board_strings)
+    memory = sub.add_parser('memory', help='compact_frame memory reduction on synthetic frames')
+    memory.add_argument('--companies', type=int, default=10000)
+    memory.add_argument('--affiliations', type=int, default=200000)
+    memory.set_defaults(func=bench_memory)
+    parse = sub.add_parser('parse', help='projected page decoding against json.loads + json_normalize')
+    parse.add_argument('--rows', type=int, default=100000)
+    parse.add_argument('--page-size', type=int, default=1000)
+    parse.set_defaults(func=bench_parse)
+    e2e = sub.add_parser('e2e', help='company_mapper end to end against a local mock Crunchbase server')
+    e2e.add_argument('--companies', type=int, nargs='+', default=[10, 1000, 10000])
+    e2e.add_argument('--latency', type=float, default=0.0, help='seconds added to every mock response')
+    e2e.add_argument('--page-size', type=int, default=1000, help='maximum entities per mock search page')
+    e2e.add_argument('--throttle-rate', type=float, default=0.0, help='share of mock requests answered with HTTP 429')
+    e2e.add_argument('--calls-per-minute', type=float, default=1e6, help='client rate limit (the mock has no quota)')
+    e2e.add_argument('--verbose', action='store_true', help='also print calls per endpoint')
+    e2e.add_argument('mapper_args', nargs=argparse.REMAINDER, help='extra company_mapper flags, after --')
+    e2e.set_defaults(func=bench_e2e)
+    startup = sub.add_parser('startup', help='startup time of the company_mapper CLI')
+    startup.add_argument('--runs', type=int, default=20, help='processes started per command')
+    startup.set_defaults(func=bench_startup)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -8,53 +8,107 @@ INPUT:
 OUTPUT FORMAT:
     Pandas DataFrame
 USAGE:
-    python -m company_mapper input.txt "True"|"False"
+    python -m company_mapper input.txt "True"|"False" [--no-cache | --refresh-cache] [--cache-path PATH]
+                             [--workers N] [--calls-per-minute N] [--timeout S] [--name-map PATH]
+                             [--incremental [--full-refresh] [--snapshot-dir DIR]]
+                             [--store PATH [--max-age HOURS] [--offline]] [--shard-size N] [--per-person]
+                             [--profile PATH] [--run-dir DIR [--resume]] [--output PATH] [--chunk-size N]
+    python -m company_mapper --serve [HOST:]PORT [--batch-window S] [any flag above]
+
+    --no-cache        Bypass the on-disk Crunchbase response cache
+    --refresh-cache   Re-download every response and overwrite the cache
+    --cache-path      Location of the cache file (default: crunchbase_cache.sqlite)
+    --workers         Maximum number of concurrent API requests (default: 8)
+    --calls-per-minute  API key quota used by the rate limiter (default: 200)
+    --timeout         Read timeout of each API call in seconds (default: 60)
+    --name-map        JSON file of company names already resolved to uuids (default: resolved_names.json)
+    --incremental     Only fetch board affiliations and investments updated since the last run
+    --full-refresh    With --incremental, pull everything and reset the stored snapshots
+    --snapshot-dir    Where --incremental keeps snapshots, one per company (default: snapshots)
+    --store           SQLite file of stored affiliations, investments and people; reused while fresh
+    --max-age         With --store, hours before stored data is pulled again (default: 168)
+    --offline         With --store, build the mapping from stored data only, without API calls
+    --shard-size      Company uuids per board/investor query; shards are paged in parallel (default: 100)
+    --per-person      Look up people with one entities/people call each instead of batched people searches
+    --profile         Write stage timings, per-call latencies, retries and bytes to a JSON/trace file
+                      and print a summary at the end
+    --run-dir         Checkpoint pages, pagination cursors and person lookups to DIR as they complete
+    --resume          With --run-dir, continue an interrupted run from its checkpoint without refetching;
+                      companies already in --output are skipped and new rows appended
+    --output          CSV file the mapping is written to (default: output.csv)
+    --chunk-size      Map the input N names at a time, end to end, appending each chunk's rows to --output
+                      as it completes; memory stays flat however many companies the input lists
+    --serve           Run as an HTTP service instead (POST /map, see mapper_service.py), keeping the session,
+                      caches and pulled data warm and batching concurrent requests together
+    --batch-window    With --serve, seconds to wait for concurrent requests to join a batch (default: 0.05)
 
 Overview:
 
-    1. Use autocompletes function to find the input company's uuid.
-    2. Use makequery_board_affiliations and go_past_1000
+    1. Use autocompletes function to find the input company's uuid
+    (deduplicated, concurrent, and remembered across runs).
+    2. Use makequery_board_affiliations and sharded_search
     functions to pull all current and former board affiliations
-     of the input company.
-    3. Use primary_info function to obtain primary job title, primary
+     of the input company (concurrently with step 5).
+    3. Use primary_info_bulk function to obtain primary job title, primary
     organization, and LinkedIn of each individual.
     4. Transform affiliations into dictionaries of concatenated
     strings. Save to CSV file.
-    5. Use makequery_investors and go_past_1000 functions to pull
+    5. Use makequery_investors and sharded_search functions to pull
     all investors of the input company.
     6. Transform investment information into dictionaries of
     concatenated strings. Update CSV file & print out results.
 
 """
 # Import relevant libraries
+import os
 import sys
-import requests
+import argparse
+import itertools
 import json
 from json import JSONDecodeError
-import pandas as pd
-from pandas import json_normalize
+from concurrent.futures import ThreadPoolExecutor
 
-# P1s Crunchbase API user key
-from user_key import userkey
+# pandas is imported on first use and the API key (user_key.py) on the first API call,
+# so --help and argument errors return without loading either
+from p1_lazy import LazyModule
+pd = LazyModule('pandas')
 
 # API POST methods
-from p1_crunchbase import url_count, url_extraction, go_past_1000
+from p1_crunchbase import go_past_1000, sharded_search
 
 # API GET methods
-from p1_crunchbase import autocompletes, primary_info, primary_info_of_people
+from p1_crunchbase import autocompletes, primary_info_of_people, primary_info_bulk
 
 # String formatting functions
 from p1_crunchbase import create_board_strings, create_investor_strings
 
-# Column formatting dictionary
-from p1_crunchbase import column_mapper
+# Column formatting dictionary and the columns pulled out of each search page
+from p1_crunchbase import column_mapper, projections
 
-# Finance round formatting dictionaries
-from p1_crunchbase import order_mapper, abbrev_mapper
+# Pooled HTTP client, response cache and rate limiter shared by every API call
+from p1_crunchbase import client, cache, limiter
 
 # Query methods
 from p1_queries import makequery_investors, makequery_board_affiliations
 
+# Retry with exponential backoff when throttled
+from p1_throttle import with_backoff
+
+# Incremental refresh using updated_at
+from p1_incremental import SnapshotStore, incremental_sharded_search
+
+# Local affiliation store
+from p1_store import AffiliationStore
+
+# Compact column types
+from p1_schema import compact_frame
+
+# Stage and API call instrumentation
+from p1_profile import profiler
+
+# Checkpoint and resume
+from p1_checkpoint import RunCheckpoint
+
 # Helper functions just for this script
 def get_uuid(x):
     try:
@@ -76,109 +130,158 @@ def str_to_bool(s):
     else:
          raise ValueError # evil ValueError that doesn't tell you what the wrong value was
 
-def main():
-    """main
-    """
-    if len(sys.argv)<=1:
-        print('Missing input!')
-        pass
-    elif len(sys.argv)==2:
-        print("Missing an argument. The script takes a company string and 'True/False'")
-        pass
-    else:
-        print_outputs = str_to_bool(sys.argv[2])
-        search_input = open("input.txt", "r").read().split('\n')
-
-    ################
-    # SEARCH INPUT #
-    ################
-
-    # Set global variable
-    global raw
-
-    # Save output uuid and value from search results
-    uuid = []
-    found_item = []
-    print('Count to {}:'.upper().format(len(search_input)), end=' ')
-    for idx,item in enumerate(search_input):
-        print(str(idx+1), end=' ')
-        uuid_found,value_found = autocompletes(item, 'organizations', limit=1, verbose=print_outputs)
-        uuid.append(uuid_found)
-        found_item.append(value_found)
-    
-    # Create dictionary that maps company names to their UUIDs (for adding to results)
-    add_uuid_to_df = dict(zip(found_item,uuid))
+def normalize_name(name):
+    '''
+    Collapse whitespace and case so that variants of the same company name share one lookup.
+    '''
+    return ' '.join(name.split()).casefold()
 
-    ######################
-    # BOARD AFFILIATIONS #
-    ######################
-
-    # Reset global variable
-    raw = pd.DataFrame()
-    
-    # Make query of current/former board affiliations of companies
-    query = makequery_board_affiliations(uuid)
-    
-    # Run query w/ API call, which populates dataframe with query results
-    comp_count = url_count(query, 'jobs')
-    raw = go_past_1000(query, 'jobs', comp_count, raw)
+def load_name_map(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, JSONDecodeError):
+        return {}
+
+def save_name_map(name_map, path):
+    # Write to a temporary file first, so an interrupted run never leaves a truncated map behind
+    with open(path+'.tmp', 'w') as f:
+        json.dump(name_map, f, indent=1, sort_keys=True)
+    os.replace(path+'.tmp', path)
+
+def resolve_companies(search_input, workers=8, name_map_path='resolved_names.json', verbose=False, offline=False,
+                      name_map=None, save_every=100):
+    '''
+    Resolve company names to Crunchbase uuids with the autocompletes function.
+    * Blank lines are skipped and names are deduplicated after normalize_name
+    * Names found in the persistent name map are never looked up again
+    * New names are resolved concurrently, paced by the shared rate limiter
+    * The name map is saved every save_every new names and when the lookups stop, so an interrupted run keeps
+      the names it already resolved
+
+    Parameters
+    ------------
+    search_input : list
+        Company names.
+    workers : int, default=8
+        Maximum number of concurrent autocompletes calls.
+    name_map_path : str, default='resolved_names.json'
+        JSON file mapping normalized names to [uuid, Crunchbase name]. None disables it.
+    verbose : bool, default=False
+        Print the autocompletes results.
+    offline : bool, default=False
+        Only use the name map; names not in it are skipped.
+    name_map : dict, optional
+        Name map already in memory, used and updated instead of reading name_map_path.
+    save_every : int, default=100
+        Number of new names resolved between saves of the name map.
+
+    Return
+    ------------
+    uuid : list
+        Unique organization uuids, in input order.
+    found_item : list
+        Crunchbase names of the organizations, in the same order.
+    '''
+    if name_map is None:
+        name_map = load_name_map(name_map_path) if name_map_path else {}
+    # Normalize & dedupe, keeping the first spelling of each name
+    names = {}
+    for item in search_input:
+        if item.strip():
+            names.setdefault(normalize_name(item), item.strip())
+    todo = [key for key in names if key not in name_map]
+    if offline and todo:
+        print('[Offline: skipping {} names missing from the name map]'.format(len(todo)), end=' ')
+        todo = []
+    print('Resolving {} unique names ({} already known):'.upper().format(len(names), len(names)-len(todo)), end=' ')
+    # Look up new names concurrently
+    def lookup(key):
+        try:
+            return with_backoff(autocompletes, names[key], 'organizations', limit=1, verbose=verbose)
+        except IndexError:
+            # No organization matched
+            return None
+    unsaved = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for idx, (key, found) in enumerate(zip(todo, executor.map(lookup, todo))):
+                print(str(idx+1), end=' ')
+                if found is None:
+                    print('[No match for {}]'.format(names[key]), end=' ')
+                    continue
+                name_map[key] = list(found)
+                unsaved += 1
+                if name_map_path and unsaved >= save_every:
+                    save_name_map(name_map, name_map_path)
+                    unsaved = 0
+    finally:
+        if name_map_path and unsaved:
+            save_name_map(name_map, name_map_path)
+    # Dedupe names that resolved to the same organization
+    resolved = {}
+    for key in names:
+        if key in name_map:
+            uuid_found, value_found = name_map[key]
+            resolved.setdefault(uuid_found, value_found)
+    return list(resolved.keys()), list(resolved.values())
+
+def run_search(make_query, uuid, query_type, snapshots=None, full=False, shard_size=100, workers=4, checkpoint=None):
+    '''
+    Page through a sharded search with sharded_search, or with incremental_sharded_search when a SnapshotStore is given.
+    * Pages are checkpointed to the run directory of a RunCheckpoint, if given
+    '''
+    if snapshots is not None:
+        return incremental_sharded_search(make_query, uuid, query_type, snapshots, shard_size=shard_size,
+                                          workers=workers, full=full, checkpoint=checkpoint)
+    # Count is read from the first page
+    return sharded_search(make_query, uuid, query_type, shard_size=shard_size, workers=workers,
+                          search=lambda query, query_type: go_past_1000(query, query_type, None, pd.DataFrame(),
+                                                                        checkpoint=checkpoint))
+
+def board_affiliations(uuid, snapshots=None, full=False, shard_size=100, workers=4, checkpoint=None):
+    '''
+    Pull current/former board affiliations of companies.
+    * uuids are split into shards of shard_size, paged concurrently by run_search
+
+    Return
+    ------------
+    aff : pandas.core.frame.DataFrame
+        Affiliations sorted by company name and sent through column_mapper.
+    '''
+    # Make queries of current/former board affiliations of companies & run them w/ API calls, one per shard
+    raw = run_search(makequery_board_affiliations, uuid, 'jobs', snapshots=snapshots, full=full, shard_size=shard_size,
+                     workers=workers, checkpoint=checkpoint)
+
+    # No affiliations found: keep going with an empty frame of the usual columns
+    if raw.empty:
+        raw = pd.DataFrame(columns=projections['jobs'])
 
     # Sort by company name
     aff = raw.sort_values(['properties.organization_identifier.value']).reset_index(drop=True) 
     
     # Send through column_mapper
     aff.rename(column_mapper, axis=1, inplace=True) 
-    
-    # Get uuids of people
-    board_uuids = list(set(aff['person_uuid'].to_list()))
-    
-    # Pull unique list of company names from series as well as autocompletes function
-    company_names = aff['company'].to_list()
-    company_names = company_names + found_item
-    company_names = sorted(list(set(company_names)))
-
-    # Display
-    print('\n\nAFFILIATIONS')
-    print('Number of companies: {}'.format(len(company_names)))
-    print('Total affiliations found: {}'.format(aff.shape[0]))
-    print('Total unique affiliations found: {}\n'.format(len(board_uuids)))
-
-    # Add primary title, primary organization, and LinkedIn to aff dataframe
-    _,titles,orgs,_,linkedin = primary_info_of_people(board_uuids)
-    aff['person_title'] = aff['person_uuid'].map(titles)
-    aff['primary_org'] = aff['person_uuid'].map(orgs)
-    aff['person_linkedin'] = aff['person_uuid'].map(linkedin)
-
-    # 1) Current board members
-    current_board_members = aff[((aff['is_current']) | (pd.isnull(aff['is_current']))) 
-                                & (aff['job_type']=='board_member')].sort_values(['person'])
-    
-    # 2) Former board members
-    former_board_members = aff[(aff['is_current']==False) & (aff['job_type']=='board_member')].sort_values(['person'])
-    
-    # 3) Current board advisors/observers
-    current_board_other = aff[((aff['is_current']) | (pd.isnull(aff['is_current']))) &
-                              (aff['job_type']!='board_member')].sort_values(['person'])
-    
-    # 4) Former board advisors/observers
-    former_board_other = aff[(aff['is_current']==False) & (aff['job_type']!='board_member')].sort_values(['person'])
-
-    # To iterate through later
-    frames = [current_board_members, former_board_members, current_board_other, former_board_other]
-
-    #############
-    # INVESTORS #
-    #############
-
-    # Reset global variable
-    raw = pd.DataFrame()
-
-    # Make query of investments in company
-    query = makequery_investors(uuid)
-
-    # Run query w/ API call, which populates dataframe with query results
-    comp_count = url_count(query, 'investments')
-    raw = go_past_1000(query, 'investments', comp_count, raw)
+    return aff
+
+def investments(uuid, snapshots=None, full=False, shard_size=100, workers=4, checkpoint=None):
+    '''
+    Pull investors of companies.
+    * uuids are split into shards of shard_size, paged concurrently by run_search
+
+    Return
+    ------------
+    investors : pandas.core.frame.DataFrame
+        One row per investor, company, financing type and partner, sent through column_mapper.
+    '''
+    # Make queries of investments in companies & run them w/ API calls, one per shard
+    raw = run_search(makequery_investors, uuid, 'investments', snapshots=snapshots, full=full, shard_size=shard_size,
+                     workers=workers, checkpoint=checkpoint)
+
+    # No investments found: return an empty frame of the usual columns
+    if raw.empty:
+        return pd.DataFrame(columns=['investor_uuid','investor_name','company','company_uuid','type',
+                                     'partner_uuid','partner_name'])
 
     # Create dataframe that contains the investor name, org name, and type of investment (for grouping)
     investors = raw.sort_values('properties.organization_identifier.value').reset_index(drop=True) # Sort by company name
@@ -199,8 +302,227 @@ def main():
     investors.rename(column_mapper, axis=1, inplace=True)
 
     # Remove duplicates
-    investors = pd.DataFrame(investors.groupby(['investor_uuid', 'investor_name', 'company', 'type', 
+    investors = pd.DataFrame(investors.groupby(['investor_uuid', 'investor_name', 'company', 'company_uuid', 'type', 
                                                 'partner_uuid', 'partner_name']).count().reset_index())
+    return investors
+
+def lookup_people(person_uuids, per_person=False, workers=8, db=None, max_age=None, offline=False, checkpoint=None):
+    '''
+    Get the primary job title, organization, and LinkedIn of individuals.
+    * Individuals found in the local store (fetched within max_age seconds) are not looked up again
+    * The rest go through primary_info_bulk, or primary_info_of_people if per_person is True
+
+    Return
+    ------------
+    Same five dictionaries as primary_info_bulk.
+    '''
+    if db is None:
+        found, missing = ({}, {}, {}, {}, {}), person_uuids
+    else:
+        *found, missing = db.people(person_uuids, max_age=max_age)
+    if not missing or offline:
+        return tuple(found)
+    if per_person:
+        fetched = primary_info_of_people(missing, workers=workers, checkpoint=checkpoint)
+    else:
+        fetched = primary_info_bulk(missing, workers=workers, checkpoint=checkpoint)
+    if db is not None:
+        db.save_people(*fetched)
+    # Merge stored and fetched dictionaries
+    return tuple({**old, **new} for old, new in zip(found, fetched))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='company_mapper',
+                                     description='Map board and investor affiliations of companies listed in a .txt file.')
+    parser.add_argument('input', nargs='?', help='.txt file of company names, one per line')
+    parser.add_argument('print_outputs', nargs='?', type=str_to_bool, help="'True' or 'False'")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument('--no-cache', action='store_true', help='bypass the on-disk response cache')
+    cache_group.add_argument('--refresh-cache', action='store_true', help='re-download responses and overwrite the cache')
+    parser.add_argument('--cache-path', default=None, help='location of the response cache file')
+    parser.add_argument('--workers', type=int, default=8, help='maximum number of concurrent API requests')
+    parser.add_argument('--calls-per-minute', type=float, default=200, help='API key quota used by the rate limiter')
+    parser.add_argument('--timeout', type=float, default=60, help='read timeout of each API call in seconds')
+    parser.add_argument('--name-map', default='resolved_names.json', help='persistent JSON map of company name to uuid')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fetch records updated since the last run and merge them into the stored snapshot')
+    parser.add_argument('--full-refresh', action='store_true', help='with --incremental, pull everything and reset the snapshot')
+    parser.add_argument('--snapshot-dir', default='snapshots', help='where --incremental keeps snapshots')
+    parser.add_argument('--store', default=None, help='SQLite file of stored affiliations, investments and people')
+    parser.add_argument('--max-age', type=float, default=168, help='with --store, hours before stored data is pulled again')
+    parser.add_argument('--offline', action='store_true', help='with --store, build the mapping from stored data only')
+    parser.add_argument('--shard-size', type=int, default=100, help='company uuids per board/investor query')
+    parser.add_argument('--per-person', action='store_true', help='look up people one entities/people call at a time')
+    parser.add_argument('--profile', default=None, metavar='PATH',
+                        help='write a JSON/trace profile of the run to PATH and print a summary')
+    parser.add_argument('--run-dir', default=None, help='directory where the run checkpoints its progress')
+    parser.add_argument('--resume', action='store_true', help='with --run-dir, continue from the last checkpoint')
+    parser.add_argument('--output', default='output.csv', help='CSV file the mapping is written to')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='map the input this many names at a time, appending each chunk to the output')
+    parser.add_argument('--serve', default=None, metavar='[HOST:]PORT', help='run as an HTTP mapping service')
+    parser.add_argument('--batch-window', type=float, default=0.05,
+                        help='with --serve, seconds to wait for concurrent requests to join a batch')
+    args = parser.parse_args(argv)
+    if args.serve is None and (args.input is None or args.print_outputs is None):
+        parser.error('input and print_outputs are required unless --serve is given')
+    if args.offline and not args.store:
+        parser.error('--offline needs --store')
+    if args.resume and not args.run_dir:
+        parser.error('--resume needs --run-dir')
+    if args.chunk_size is not None and args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    return args
+
+def board_frames(aff):
+    '''
+    Split board affiliations into the four frames passed to create_board_strings, each sorted by person.
+    * is_current is expected as board_affiliations returns it, an object column of True/False/None;
+      the masks rely on its object semantics for missing values, so it is never cast to a nullable boolean
+
+    Return
+    ------------
+    frames : list
+        Current board members, former board members, current board advisors/observers, former board advisors/observers.
+    '''
+    # 1) Current board members
+    current_board_members = aff[((aff['is_current']) | (pd.isnull(aff['is_current']))) 
+                                & (aff['job_type']=='board_member')].sort_values(['person'])
+
+    # 2) Former board members
+    former_board_members = aff[(aff['is_current']==False) & (aff['job_type']=='board_member')].sort_values(['person'])
+
+    # 3) Current board advisors/observers
+    current_board_other = aff[((aff['is_current']) | (pd.isnull(aff['is_current']))) &
+                              (aff['job_type']!='board_member')].sort_values(['person'])
+
+    # 4) Former board advisors/observers
+    former_board_other = aff[(aff['is_current']==False) & (aff['job_type']!='board_member')].sort_values(['person'])
+
+    return [current_board_members, former_board_members, current_board_other, former_board_other]
+
+def configure(args):
+    '''
+    Apply the cache, rate limit and connection settings of parsed arguments to the shared client.
+
+    Return
+    ------------
+    snapshots : SnapshotStore or None
+        Snapshots for --incremental.
+    db : AffiliationStore or None
+        Local affiliation store for --store.
+    max_age : float or None
+        Seconds before stored data is pulled again (None with --offline).
+    '''
+    # Response cache switches
+    cache.bypass = args.no_cache
+    cache.refresh = args.refresh_cache
+    if args.cache_path:
+        cache.path = args.cache_path
+
+    # Rate limit to the API key quota
+    limiter.rate = args.calls_per_minute/60
+
+    # Size the connection pool to the number of workers
+    client.pool_maxsize = max(client.pool_maxsize, args.workers)
+    client.timeout = (10, args.timeout)
+
+    # Snapshots for incremental refreshes
+    snapshots = SnapshotStore(args.snapshot_dir) if args.incremental else None
+
+    # Local affiliation store
+    db = AffiliationStore(args.store) if args.store else None
+    max_age = None if args.offline else args.max_age*3600
+    return snapshots, db, max_age
+
+def build_mapping(uuid, found_item, args, snapshots=None, db=None, max_age=None, checkpoint=None):
+    '''
+    Pull board affiliations, people and investors of resolved companies and build the mapping DataFrame.
+    * The investor stage runs in the background while the board stage and people lookup run
+
+    Parameters
+    ------------
+    uuid, found_item : list
+        Organization uuids and Crunchbase names, as returned by resolve_companies.
+    args : argparse.Namespace
+        Parsed company_mapper arguments (workers, shard_size, per_person, offline, full_refresh).
+    snapshots, db, max_age
+        As returned by configure.
+    checkpoint : RunCheckpoint, optional
+        Run directory where searches and person lookups are checkpointed (--run-dir).
+
+    Return
+    ------------
+    mapping : pandas.core.frame.DataFrame
+        One row per company, with the columns written to output.csv.
+    '''
+    # Create dictionary that maps company names to their UUIDs (for adding to results)
+    add_uuid_to_df = dict(zip(found_item,uuid))
+
+    ####################################
+    # BOARD AFFILIATIONS AND INVESTORS #
+    ####################################
+
+    # Pull current/former board affiliations of companies, renamed through column_mapper and sorted by company
+    # (read from the local store instead when it holds fresh enough data)
+    def board_stage():
+        with profiler.stage('board pull'):
+            if db is not None and (args.offline or db.is_fresh(uuid, 'jobs', max_age)):
+                return db.jobs(uuid)
+            aff = board_affiliations(uuid, snapshots=snapshots, full=args.full_refresh,
+                                     shard_size=args.shard_size, workers=args.workers, checkpoint=checkpoint)
+            if db is not None:
+                db.save_jobs(aff, uuid)
+            return aff
+
+    # Pull investments in companies, deduplicated and renamed through column_mapper
+    def investor_stage():
+        with profiler.stage('investor pull'):
+            if db is not None and (args.offline or db.is_fresh(uuid, 'investments', max_age)):
+                return db.investments(uuid)
+            investors = investments(uuid, snapshots=snapshots, full=args.full_refresh,
+                                    shard_size=args.shard_size, workers=args.workers, checkpoint=checkpoint)
+            if db is not None:
+                db.save_investments(investors, uuid)
+            return investors
+
+    # The two stages are independent: run the investor stage in the background while the board stage runs
+    with ThreadPoolExecutor(max_workers=1) as stages:
+        investor_future = stages.submit(investor_stage)
+        aff = compact_frame(board_stage())
+
+        # Get uuids of people
+        board_uuids = list(set(aff['person_uuid'].to_list()))
+    
+        # Pull unique list of company names from series as well as autocompletes function
+        company_names = aff['company'].to_list()
+        company_names = company_names + found_item
+        company_names = sorted(list(set(company_names)))
+
+        # Display
+        print('\n\nAFFILIATIONS')
+        print('Number of companies: {}'.format(len(company_names)))
+        print('Total affiliations found: {}'.format(aff.shape[0]))
+        print('Total unique affiliations found: {}\n'.format(len(board_uuids)))
+
+        # Add primary title, primary organization, and LinkedIn to aff dataframe
+        with profiler.stage('people lookup'):
+            _,titles,orgs,_,linkedin = lookup_people(board_uuids, per_person=args.per_person, workers=args.workers,
+                                                     db=db, max_age=max_age, offline=args.offline, checkpoint=checkpoint)
+        aff['person_title'] = aff['person_uuid'].map(titles)
+        aff['primary_org'] = aff['person_uuid'].map(orgs)
+        aff['person_linkedin'] = aff['person_uuid'].map(linkedin)
+
+        # Current/former board members and advisors/observers, to iterate through later
+        frames = board_frames(aff)
+
+        #############
+        # INVESTORS #
+        #############
+
+        # Wait for the investor stage
+        with profiler.stage('investor wait'):
+            investors = compact_frame(investor_future.result())
 
     print('INVESTMENTS')
     print('Number of companies: {}'.format(len(company_names)))
@@ -211,47 +533,148 @@ def main():
     # CREATE DATAFRAME #
     ####################
     
-    # Create dictionaries for board affiliations & add to mapper dictionary
-    map_dict = create_board_strings(frames, company_names)
-    
-    # Create dictionaries for investor information
-    investors_all, investors_w_info = create_investor_strings(investors)
-    
-    # Add to mapper dictionary
-    map_dict.append(investors_all)
-    map_dict.append(investors_w_info)
-
-    # Create `mapping` dataframe
-    aff_mapper = {}
-    columns = ['Current Board Members','Former Board Members',
-               'Current Board Advisors/Observers','Former Board Advisors/Observers',
-               'Investors (All)','Investors (w/ Info)']
-    for key in company_names:
-        aff_mapper[key] = [map_dict[0][key], map_dict[1][key], map_dict[2][key], 
-                           map_dict[3][key], map_dict[4][key], map_dict[5][key]]
-    mapping = pd.DataFrame.from_dict(aff_mapper, orient='index', 
-                                     columns=columns).reset_index().rename({'index':'Company'}, axis=1)
-    
-    # Add Company UUID created by autocompletes function
-    mapping['Company UUID'] = mapping['Company'].map(add_uuid_to_df)
-    
-    # Adjust columns
-    mapping = mapping[['Company', 'Current Board Members', 'Former Board Members', 'Current Board Advisors/Observers',
-                       'Former Board Advisors/Observers', 'Investors (All)', 'Investors (w/ Info)', 'Company UUID']]
+    with profiler.stage('string building'):
+        # Create dictionaries for board affiliations & add to mapper dictionary
+        map_dict = create_board_strings(frames, company_names)
+
+        # Create dictionaries for investor information
+        investors_all, investors_w_info = create_investor_strings(investors)
+
+        # Add to mapper dictionary
+        map_dict.append(investors_all)
+        map_dict.append(investors_w_info)
+
+        # Create `mapping` dataframe
+        aff_mapper = {}
+        columns = ['Current Board Members','Former Board Members',
+                   'Current Board Advisors/Observers','Former Board Advisors/Observers',
+                   'Investors (All)','Investors (w/ Info)']
+        for key in company_names:
+            aff_mapper[key] = [map_dict[0][key], map_dict[1][key], map_dict[2][key], 
+                               map_dict[3][key], map_dict[4].get(key, ''), map_dict[5].get(key, '')]
+        mapping = pd.DataFrame.from_dict(aff_mapper, orient='index', 
+                                         columns=columns).reset_index().rename({'index':'Company'}, axis=1)
+
+        # Add Company UUID created by autocompletes function
+        mapping['Company UUID'] = mapping['Company'].map(add_uuid_to_df)
+
+        # Adjust columns
+        mapping = mapping[['Company', 'Current Board Members', 'Former Board Members', 'Current Board Advisors/Observers',
+                           'Former Board Advisors/Observers', 'Investors (All)', 'Investors (w/ Info)', 'Company UUID']]
+    return mapping
+
+def read_chunks(path, chunk_size=None):
+    '''
+    Yield the company names of a .txt file in lists of chunk_size lines, reading the file lazily.
+    chunk_size=None yields the whole file as one list.
+    '''
+    with open(path, 'r') as f:
+        lines = (line.rstrip('\n') for line in f)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+def written_companies(path):
+    '''
+    Return the set of Company UUIDs already written to an output CSV (empty if there is none).
+    '''
+    try:
+        return set(pd.read_csv(path, usecols=['Company UUID'])['Company UUID'])
+    except (FileNotFoundError, pd.errors.EmptyDataError, ValueError):
+        return set()
+
+def map_in_chunks(args, snapshots=None, db=None, max_age=None, checkpoint=None):
+    '''
+    Run the whole pipeline on args.input args.chunk_size names at a time, appending each chunk's rows
+    to args.output as soon as the chunk is done.
+    * Only one chunk's frames are held in memory, so memory stays flat however long the input is
+    * The output is a valid CSV after every chunk and can be read while the run goes on
+    * Companies already written (found again in a later chunk, or by an interrupted run when
+      resuming) are skipped
+
+    Parameters
+    ------------
+    args : argparse.Namespace
+        Parsed arguments (input, print_outputs, output, chunk_size, ...).
+    snapshots, db, max_age, checkpoint :
+        As returned by configure and RunCheckpoint, passed to build_mapping.
+
+    Return
+    ------------
+    rows : int
+        Number of rows written by this run.
+    '''
+    written = written_companies(args.output) if args.resume else set()
+    if written:
+        print('RESUMING: {} COMPANIES ALREADY IN {}'.format(len(written), args.output))
+    rows = 0
+    for number, chunk in enumerate(read_chunks(args.input, args.chunk_size)):
+        if args.chunk_size:
+            print('\n\nCHUNK {} ({} NAMES)'.format(number+1, len(chunk)))
+
+        ################
+        # SEARCH INPUT #
+        ################
+
+        # Save output uuid and value from search results
+        with profiler.stage('resolution'):
+            uuid, found_item = resolve_companies(chunk, workers=args.workers, name_map_path=args.name_map,
+                                                 verbose=args.print_outputs, offline=args.offline)
+        todo = [(u, item) for u, item in zip(uuid, found_item) if u not in written]
+        if not todo:
+            continue
+        uuid, found_item = [u for u, _ in todo], [item for _, item in todo]
+
+        # Board affiliations, people and investors, as one row of strings per company
+        mapping = build_mapping(uuid, found_item, args, snapshots=snapshots, db=db, max_age=max_age,
+                                checkpoint=checkpoint)
+
+        ##################
+        # PRINT & OUTPUT #
+        ##################
+
+        if args.print_outputs:
+            for index,row in mapping.iterrows():
+                print('*'*50)
+                print('Results for {}'.format(row['Company']))
+                print('*'*50)
+                for col in mapping.columns[1:]:
+                    print('{}:\n{}\n\n'.format(col.upper(), row[col]))
+        with profiler.stage('csv write'):
+            # The first chunk of a fresh run writes the header, every later chunk appends
+            header = not (written or rows)
+            mapping.to_csv(args.output, mode='w' if header else 'a', header=header, index=False)
+        written.update(mapping['Company UUID'])
+        rows += len(mapping)
+        print('\nRESULTS WRITTEN TO {} ({} ROWS SO FAR)'.format(args.output, len(written)))
+    return rows
 
-    ##################
-    # PRINT & OUTPUT #
-    ##################
-    
-    if print_outputs:
-        for index,row in mapping.iterrows():
-            print('*'*50)
-            print('Results for {}'.format(row['Company']))
-            print('*'*50)
-            for col in mapping.columns[1:]:
-                print('{}:\n{}\n\n'.format(col.upper(), row[col]))
-    print('\nRESULTS WRITTEN TO output.csv')
-    mapping.to_csv('output.csv', index=False)
+def main():
+    """main
+    """
+    args = parse_args(sys.argv[1:])
+    if args.serve:
+        from mapper_service import serve
+        return serve(args)
+
+    # Record stage timings and API calls
+    if args.profile:
+        profiler.enable()
+
+    # Cache, rate limit, connection pool, snapshots and local store
+    snapshots, db, max_age = configure(args)
+
+    # Checkpoint of this run's searches and person lookups
+    checkpoint = RunCheckpoint(args.run_dir, resume=args.resume) if args.run_dir else None
+
+    # Map the input file, one chunk at a time with --chunk-size
+    map_in_chunks(args, snapshots=snapshots, db=db, max_age=max_age, checkpoint=checkpoint)
+
+    if args.profile:
+        print('\n'+profiler.summary(profiler.write(args.profile)))
+        print('\nPROFILE WRITTEN TO {}'.format(args.profile))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+"""
+Long-running HTTP service mode of company_mapper.
+Keeps the pooled client session, the response cache, the resolved name map and an affiliation store warm
+between requests, and coalesces concurrent requests into shared batched API queries.
+
+USAGE:
+    python -m company_mapper --serve 8765 [--batch-window 0.05] [any other company_mapper flag]
+
+    POST /map    {"companies": ["Salesforce", "Slack"]}  or  {"company": "Salesforce"}
+                 -> {"results": {"Salesforce": {"Company": ..., "Current Board Members": ..., ...}, "Slack": ...},
+                     "seconds": 1.2}
+                 Names that could not be resolved map to null.
+    GET  /stats  -> request, batch and cache counters
+
+    From a notebook:
+        requests.post('http://localhost:8765/map', json={'companies':['Salesforce']}).json()['results']
+"""
+import json
+import time
+import threading
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class MappingBatcher:
+    '''
+    Coalesces concurrent mapping requests into shared batches.
+    * The first pending request opens a batch; requests arriving within `window` seconds join it
+    * One batch runs at a time: requests arriving while a batch runs form the next batch
+    * Every request gets a Future resolving to {name:row} for its own names
+
+    Parameters
+    ------------
+    run_batch : function
+        Called with the list of every company name in a batch, returns {name:row}.
+    window : float, default=0.05
+        Seconds to wait for more requests before running a batch.
+    max_batch : int, default=1000
+        Stop waiting once this many names are pending.
+    '''
+    def __init__(self, run_batch, window=0.05, max_batch=1000):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self.names = 0
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name='mapping-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, names):
+        '''
+        Queue company names and return a Future of {name:row}.
+        '''
+        future = Future()
+        with self._cond:
+            self._pending.append((list(names), future))
+            self.requests += 1
+            self._cond.notify()
+        return future
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent requests a moment to join the batch
+                deadline = time.monotonic()+self.window
+                while sum(len(names) for names, _ in self._pending) < self.max_batch:
+                    remaining = deadline-time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+            names = list(dict.fromkeys(name for names, _ in batch for name in names))
+            try:
+                results = self.run_batch(names)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.names += len(names)
+            for names, future in batch:
+                future.set_result({name:results.get(name) for name in names})
+
+class MapperService:
+    '''
+    Warm state shared by every request: company_mapper settings, name map and affiliation store.
+    * Without --store, an in-memory AffiliationStore keeps pulled jobs, investments and people
+      for --max-age hours, so repeated companies are served without API calls
+
+    Parameters
+    ------------
+    args : argparse.Namespace
+        Parsed company_mapper arguments.
+    '''
+    def __init__(self, args):
+        import company_mapper
+        from p1_store import AffiliationStore
+        self.mapper = company_mapper
+        self.args = args
+        self.snapshots, self.db, self.max_age = company_mapper.configure(args)
+        if self.db is None:
+            self.db = AffiliationStore(':memory:')
+        self.name_map = company_mapper.load_name_map(args.name_map) if args.name_map else {}
+        self.batcher = MappingBatcher(self.run_batch, window=args.batch_window)
+
+    def run_batch(self, names):
+        '''
+        Map every company of a batch in one pass of company_mapper's pipeline and return {name:row}.
+        '''
+        mapper = self.mapper
+        uuid, found_item = mapper.resolve_companies(names, workers=self.args.workers, name_map_path=self.args.name_map,
+                                                    offline=self.args.offline, name_map=self.name_map)
+        if not uuid:
+            return {}
+        mapping = mapper.build_mapping(uuid, found_item, self.args, snapshots=self.snapshots, db=self.db,
+                                       max_age=self.max_age)
+        mapping = mapping.astype(object).where(mapping.notna(), None)
+        rows = {row['Company UUID']:row for row in mapping.to_dict('records')}
+        results = {}
+        for name in names:
+            found = self.name_map.get(mapper.normalize_name(name))
+            if found is not None and found[0] in rows:
+                results[name] = rows[found[0]]
+        return results
+
+    def map(self, names):
+        '''
+        Return {name:row or None} for company names, sharing API queries with concurrent calls.
+        '''
+        return self.batcher.submit(names).result()
+
+    def stats(self):
+        from p1_crunchbase import cache, client
+        return {'requests':self.batcher.requests, 'batches':self.batcher.batches, 'companies':self.batcher.names,
+                'cache_hits':cache.hits, 'cache_misses':cache.misses, 'coalesced_calls':client.coalesced}
+
+    def handler(self):
+        service = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def reply(self, status, obj):
+                body = json.dumps(obj).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self.reply(200, service.stats())
+                else:
+                    self.reply(404, {'error':'unknown path: {}'.format(self.path)})
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/map':
+                    return self.reply(404, {'error':'unknown path: {}'.format(self.path)})
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                    names = request['companies'] if 'companies' in request else [request['company']]
+                    if isinstance(names, str) or not all(isinstance(name, str) for name in names):
+                        raise TypeError
+                except (ValueError, KeyError, TypeError):
+                    return self.reply(400, {'error':'expected {"companies": [names]} or {"company": name}'})
+                start = time.perf_counter()
+                try:
+                    results = service.map(names)
+                except Exception as e:
+                    return self.reply(500, {'error':'{}: {}'.format(type(e).__name__, e)})
+                self.reply(200, {'results':results, 'seconds':time.perf_counter()-start})
+
+            def log_message(self, format, *args):
+                print('[{}] {}'.format(self.log_date_time_string(), format % args))
+        return Handler
+
+def serve(args):
+    '''
+    Run the mapping service on args.serve ('PORT' or 'HOST:PORT') until interrupted.
+    '''
+    host, _, port = args.serve.rpartition(':')
+    service = MapperService(args)
+    server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), service.handler())
+    server.daemon_threads = True
+    print('SERVING company_mapper ON http://{}:{}/map'.format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.db.close()
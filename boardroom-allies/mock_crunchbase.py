@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Crunchbase v4 API, for benchmarks and offline runs of company_mapper.
+Serves synthetic (or recorded) searches/*, entities/people/* and autocompletes responses.
+
+USAGE:
+    python mock_crunchbase.py [--companies 1000] [--port 8000] [--latency 0.05] [--page-size 1000]
+                              [--throttle-rate 0.0] [--recorded crunchbase_cache.sqlite]
+
+    Then point the client at it, e.g. p1_crunchbase.client.base_url = 'http://127.0.0.1:8000/api/v4/'
+"""
+import json
+import gzip
+import time
+import random
+import bisect
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+job_types = ['board_member','board_member','advisor','board_observer','executive','employee']
+rounds = ['Pre Seed Round','Seed Round','Series A','Series B','Series C','Series D','Angel Round',
+          'Venture Round','Corporate Round','Debt Financing','Convertible Note']
+
+def ident(uuid, value, entity_def_id):
+    return {'uuid':uuid, 'value':value, 'permalink':uuid, 'entity_def_id':entity_def_id}
+
+class SyntheticData:
+    '''
+    Deterministic synthetic Crunchbase data: companies, people, board/executive jobs and investments.
+    * Company i is named 'Company i' with uuid 'org-<i>', so a portfolio is just a list of names
+    * People and investors are shared across companies, so co-affiliations exist
+
+    Parameters
+    ------------
+    companies : int, default=1000
+        Number of companies.
+    jobs_per_company : int, default=6
+        Average number of jobs (board and executive) per company.
+    investments_per_company : int, default=8
+        Average number of investments per company.
+    seed : int, default=0
+        Random seed.
+    '''
+    def __init__(self, companies=1000, jobs_per_company=6, investments_per_company=8, seed=0):
+        rng = random.Random(seed)
+        people = max(1, companies*jobs_per_company//3)
+        investors = max(1, companies//4)
+        self.companies = [ident('org-{:06d}'.format(i), 'Company {}'.format(i), 'organization') for i in range(companies)]
+        self.people = {}
+        for i in range(people):
+            uuid = 'person-{:08d}'.format(i)
+            props = {'identifier':ident(uuid, 'Person {}'.format(i), 'person'),
+                     'primary_job_title':'Partner' if i % 4 else 'CEO'}
+            if i % 9:
+                org = rng.randrange(companies)
+                props['primary_organization'] = ident('org-{:06d}'.format(org), 'Company {}'.format(org), 'organization')
+            if i % 5:
+                props['linkedin'] = {'value':'https://www.linkedin.com/in/person-{}'.format(i)}
+            self.people[uuid] = {'uuid':uuid, 'properties':props}
+        self.jobs = []
+        self.investments = []
+        for i, org in enumerate(self.companies):
+            for j in range(rng.randint(jobs_per_company//2, jobs_per_company*3//2)):
+                person = self.people['person-{:08d}'.format(rng.randrange(people))]['properties']['identifier']
+                uuid = 'job-{:06d}-{:03d}'.format(i, j)
+                props = {'identifier':ident(uuid, '{} at {}'.format(person['value'], org['value']), 'job'),
+                         'organization_identifier':org, 'person_identifier':person, 'job_type':rng.choice(job_types),
+                         'title':'Board Member', 'updated_at':'2021-01-{:02d}T00:00:00Z'.format(rng.randint(1, 28))}
+                # Crunchbase leaves is_current out of some records
+                current = rng.random()
+                if current < 0.9:
+                    props['is_current'] = current < 0.6
+                self.jobs.append({'uuid':uuid, 'properties':props})
+            for j in range(rng.randint(investments_per_company//2, investments_per_company*3//2)):
+                investor = rng.randrange(investors)
+                uuid = 'investment-{:06d}-{:03d}'.format(i, j)
+                round_type = rng.choice(rounds)
+                props = {'identifier':ident(uuid, 'Investor {} investment in {} - {}'.format(investor, round_type, org['value']),
+                                            'investment'),
+                         'name':'Investor {} investment in {} - {}'.format(investor, round_type, org['value']),
+                         'organization_identifier':org,
+                         'investor_identifier':ident('investor-{:06d}'.format(investor), 'Investor {}'.format(investor),
+                                                     'organization'),
+                         'updated_at':'2021-01-{:02d}T00:00:00Z'.format(rng.randint(1, 28))}
+                if rng.random() < 0.4:
+                    props['partner_identifiers'] = [self.people['person-{:08d}'.format(rng.randrange(people))]['properties']['identifier']]
+                self.investments.append({'uuid':uuid, 'properties':props})
+        self.collections = {'jobs':self.jobs, 'investments':self.investments, 'people':list(self.people.values()),
+                            'organizations':[{'uuid':org['uuid'], 'properties':{'identifier':org}} for org in self.companies]}
+        # Index the fields company_mapper searches on
+        self.index = {}
+        for name, entities in self.collections.items():
+            entities.sort(key=lambda entity: entity['uuid'])
+            by_field = {'uuid':{}, 'organization_identifier':{}}
+            for entity in entities:
+                by_field['uuid'].setdefault(entity['uuid'], []).append(entity)
+                org = entity['properties'].get('organization_identifier')
+                if org is not None:
+                    by_field['organization_identifier'].setdefault(org['uuid'], []).append(entity)
+            self.index[name] = by_field
+        self.by_name = {org['value'].lower():org for org in self.companies}
+
+def field_value(entity, field_id):
+    # Identifiers compare by uuid
+    value = entity['uuid'] if field_id == 'uuid' else entity['properties'].get(field_id)
+    return value['uuid'] if isinstance(value, dict) else value
+
+def matches(entity, predicate):
+    value, values, op = field_value(entity, predicate['field_id']), predicate.get('values', []), predicate['operator_id']
+    if op == 'includes':
+        return value in values
+    if op == 'not_includes':
+        return value not in values
+    if op == 'eq':
+        return value == values[0]
+    if op == 'gte':
+        return value is not None and value >= values[0]
+    if op == 'lte':
+        return value is not None and value <= values[0]
+    raise ValueError('unsupported operator_id: {}'.format(op))
+
+class MockCrunchbase:
+    '''
+    Threaded HTTP server answering like api.crunchbase.com/api/v4/.
+    * GET autocompletes, GET entities/people/<uuid>, POST searches/<collection>
+    * Searches support 'includes', 'not_includes', 'eq', 'gte' and 'lte' predicates, limit and after_id paging
+    * Counts requests, throttled requests and bytes sent, so benchmarks can report API usage
+    * Use as a context manager, or call start()/stop()
+
+    Parameters
+    ------------
+    data : SyntheticData, optional
+        Served data. Defaults to SyntheticData(1000).
+    port : int, default=0
+        Port to listen on. 0 picks a free port.
+    latency : float, default=0.0
+        Seconds added to every response.
+    page_size : int, default=1000
+        Maximum entities per search page, whatever the query's limit.
+    throttle_rate : float, default=0.0
+        Share of requests answered with HTTP 429.
+    recorded : str, optional
+        SQLite file of a p1_cache.ResponseCache. Requests recorded there are answered with the recorded
+        body, whatever its age; other requests fall back to the synthetic data.
+    seed : int, default=0
+        Seed of the throttling draws.
+    '''
+    def __init__(self, data=None, port=0, latency=0.0, page_size=1000, throttle_rate=0.0, recorded=None, seed=0):
+        self.data = data if data is not None else SyntheticData(1000)
+        self.latency = latency
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.recorded = None
+        if recorded is not None:
+            from p1_cache import ResponseCache
+            self.recorded = ResponseCache(recorded, ttls={'':float('inf')}, default_ttl=float('inf'))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._results = {}
+        self.reset_counters()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{}/api/v4/'.format(self.server.server_address[1])
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+            self.bytes_sent = 0
+            self.by_endpoint = {}
+
+    def counters(self):
+        '''
+        Return the request, throttle and byte counters as a dictionary.
+        '''
+        with self._lock:
+            return {'requests':self.requests, 'throttled':self.throttled, 'bytes':self.bytes_sent,
+                    'by_endpoint':dict(self.by_endpoint)}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, method, endpoint, params, query):
+        '''
+        Return (status, body) for one request.
+        '''
+        if self.recorded is not None:
+            body = self.recorded.get(self.recorded.make_key(endpoint, params or None, query), endpoint)
+            if body is not None:
+                return 200, body if isinstance(body, bytes) else body.encode('utf-8')
+        if method == 'GET' and endpoint == 'autocompletes':
+            return 200, self.autocompletes(params)
+        if method == 'GET' and endpoint.startswith('entities/people/'):
+            person = self.data.people.get(endpoint.split('/', 2)[2])
+            if person is None:
+                return 404, error('not_found', 'Entity not found')
+            return 200, dump({'properties':select(person['properties'], params.get('field_ids'))})
+        if method == 'POST' and endpoint.startswith('searches/'):
+            collection = endpoint.split('/', 1)[1]
+            if collection not in self.data.collections:
+                return 400, error('invalid_argument', 'Unknown collection: {}'.format(collection))
+            return 200, self.search(collection, query or {})
+        return 404, error('not_found', 'Unknown endpoint: {}'.format(endpoint))
+
+    def autocompletes(self, params):
+        name = params.get('query', '').strip().lower()
+        limit = int(params.get('limit', 10))
+        found = self.data.by_name.get(name)
+        entities = [found] if found is not None else [org for key, org in self.data.by_name.items() if key.startswith(name)][:limit]
+        return dump({'count':len(entities),
+                     'entities':[{'identifier':org, 'short_description':'Synthetic company {}'.format(org['value'])}
+                                 for org in entities[:limit]]})
+
+    def search(self, collection, query):
+        predicates = [p for p in query.get('query', []) if p.get('type') == 'predicate']
+        # Results of the query without its cursor are kept between pages of the same search
+        key = json.dumps([collection, predicates], sort_keys=True)
+        with self._lock:
+            result = self._results.get(key)
+        if result is None:
+            result = self.filter(collection, predicates)
+            with self._lock:
+                if len(self._results) > 1024:
+                    self._results.clear()
+                self._results[key] = result
+        entities, uuids = result
+        start = bisect.bisect_right(uuids, query['after_id']) if query.get('after_id') else 0
+        limit = min(int(query.get('limit', 50)), self.page_size)
+        fields = query.get('field_ids')
+        page = [{'uuid':entity['uuid'], 'properties':select(entity['properties'], fields)}
+                for entity in entities[start:start+limit]]
+        return dump({'count':len(entities), 'entities':page})
+
+    def filter(self, collection, predicates):
+        # Start from an index lookup when a predicate allows it, then check every predicate
+        candidates = self.data.collections[collection]
+        for predicate in predicates:
+            index = self.data.index[collection].get(predicate['field_id'])
+            if predicate['operator_id'] == 'includes' and index is not None:
+                candidates = sorted((entity for value in set(predicate['values']) for entity in index.get(value, [])),
+                                    key=lambda entity: entity['uuid'])
+                break
+        entities = [entity for entity in candidates if all(matches(entity, p) for p in predicates)]
+        return entities, [entity['uuid'] for entity in entities]
+
+    def handler(self):
+        mock = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately: don't let Nagle's algorithm hold the body back
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self.answer('GET')
+
+            def do_POST(self):
+                self.answer('POST')
+
+            def answer(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                query = json.loads(self.rfile.read(length)) if length else None
+                # URL parameters arrive as strings: turn numbers back into ints, drop the user key
+                params = {k:int(v) if v.isdigit() else v for k, v in parse_qsl(url.query) if k != 'user_key'}
+                endpoint = url.path.split('/api/v4/', 1)[-1]
+                if mock.latency:
+                    time.sleep(mock.latency)
+                with mock._lock:
+                    throttled = mock._rng.random() < mock.throttle_rate
+                if throttled:
+                    status, body = 429, error('rate_limit_exceeded', 'Usage limit exceeded')
+                else:
+                    try:
+                        status, body = mock.respond(method, endpoint, params, query)
+                    except (KeyError, ValueError, TypeError) as e:
+                        status, body = 400, error('invalid_argument', str(e))
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body, compresslevel=1)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with mock._lock:
+                    mock.requests += 1
+                    mock.throttled += throttled
+                    mock.bytes_sent += len(body)
+                    name = endpoint.split('/')[0] if not endpoint.startswith('searches/') else endpoint
+                    mock.by_endpoint[name] = mock.by_endpoint.get(name, 0)+1
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+def select(props, fields):
+    # Keep the requested field_ids (given as a list or a comma-separated string), plus the identifier
+    if not fields:
+        return props
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return {key:value for key, value in props.items() if key in fields or key == 'identifier'}
+
+def dump(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def error(code, message):
+    return dump([{'code':code, 'message':message}])
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Crunchbase v4 API.')
+    parser.add_argument('--companies', type=int, default=1000, help='number of synthetic companies')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--page-size', type=int, default=1000, help='maximum entities per search page')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of requests answered with HTTP 429')
+    parser.add_argument('--recorded', help='ResponseCache SQLite file to replay recorded responses from')
+    args = parser.parse_args()
+    mock = MockCrunchbase(SyntheticData(args.companies), port=args.port, latency=args.latency,
+                          page_size=args.page_size, throttle_rate=args.throttle_rate, recorded=args.recorded)
+    print('Serving {} synthetic companies at {}'.format(args.companies, mock.base_url))
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(mock.counters()))
+        mock.server.server_close()
+
+if __name__ == "__main__":
+    main()
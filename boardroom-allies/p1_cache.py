@@ -0,0 +1,177 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Default time-to-live (seconds) per Crunchbase endpoint prefix
+default_ttls = {'autocompletes': 30*24*3600,
+                'entities/people': 7*24*3600,
+                'searches': 24*3600}
+
+# Lists inside a query whose order does not change the API response
+unordered_keys = ['values', 'field_ids']
+
+def canonicalize(obj):
+    '''
+    Return a copy of a query/params object with a stable ordering, so that equivalent requests share a cache key.
+    * Dictionary keys are sorted by json.dumps
+    * Lists of predicate values and field ids are sorted
+
+    Parameters
+    ------------
+    obj : dict, list, or scalar
+        Query as json or request parameters.
+
+    Return
+    ------------
+    obj : dict, list, or scalar
+        Canonicalized copy of the input.
+    '''
+    if isinstance(obj, dict):
+        out = {}
+        for key, val in obj.items():
+            val = canonicalize(val)
+            # Sort order-insensitive lists of strings
+            if key in unordered_keys and isinstance(val, list) and all(isinstance(v, str) for v in val):
+                val = sorted(val)
+            out[key] = val
+        return out
+    if isinstance(obj, (list, tuple)):
+        return [canonicalize(v) for v in obj]
+    return obj
+
+class ResponseCache:
+    '''
+    On-disk cache of raw Crunchbase API response bodies, stored in a SQLite file.
+    * Keyed by endpoint + canonicalized params and query
+    * Entries expire after a per-endpoint TTL
+    * Least recently used entries are evicted once the file grows past max_bytes
+
+    Parameters
+    ------------
+    path : str, default='crunchbase_cache.sqlite'
+        Location of the SQLite file.
+    ttls : dict, optional
+        Endpoint prefix to TTL in seconds. Merged over default_ttls.
+    default_ttl : int, default=86400
+        TTL for endpoints that don't match any prefix in ttls.
+    max_bytes : int, default=256MB
+        Maximum total size of stored response bodies.
+    bypass : bool, default=False
+        If True, never read from or write to the cache.
+    refresh : bool, default=False
+        If True, ignore stored entries but store fresh responses.
+    '''
+    def __init__(self, path='crunchbase_cache.sqlite', ttls=None, default_ttl=24*3600,
+                 max_bytes=256*1024*1024, bypass=False, refresh=False):
+        self.path = path
+        self.ttls = {**default_ttls, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Open the SQLite file on first use, so importing p1_crunchbase doesn't touch the disk
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, endpoint TEXT, '
+                               'body TEXT, size INTEGER, created REAL, accessed REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+            # Running size of the stored bodies, kept up to date by set and clear
+            self._total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(endpoint, params=None, query=None):
+        '''
+        Return the cache key of a request.
+
+        Parameters
+        ------------
+        endpoint : str
+            API path after /api/v4/, e.g. 'searches/jobs'.
+        params : dict, optional
+            URL parameters, excluding the user key.
+        query : json, optional
+            POST body.
+
+        Return
+        ------------
+        key : str
+            sha256 hex digest of the canonicalized request.
+        '''
+        blob = json.dumps([endpoint, canonicalize(params or {}), canonicalize(query)],
+                          sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, endpoint):
+        '''
+        Return the TTL of an endpoint, using the longest matching prefix in ttls.
+        '''
+        matches = [prefix for prefix in self.ttls if endpoint.startswith(prefix)]
+        if not matches:
+            return self.default_ttl
+        return self.ttls[max(matches, key=len)]
+
+    def get(self, key, endpoint):
+        '''
+        Return a stored response body, or None if it is missing, expired, or the cache is bypassed/refreshing.
+        '''
+        if self.bypass or self.refresh:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT body, created FROM responses WHERE key=?', (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_for(endpoint):
+                self.misses += 1
+                return None
+            # Mark as recently used for LRU eviction
+            conn.execute('UPDATE responses SET accessed=? WHERE key=?', (now, key))
+            conn.commit()
+            self.hits += 1
+        return row[0]
+
+    def set(self, key, endpoint, body):
+        '''
+        Store a response body (str or bytes) and evict least recently used entries if the cache is over max_bytes.
+        '''
+        if self.bypass:
+            return
+        now = time.time()
+        size = len(body) if isinstance(body, bytes) else len(body.encode('utf-8'))
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute('SELECT size FROM responses WHERE key=?', (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?)', (key, endpoint, body, size, now, now))
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                # Walk entries from least to most recently used until enough space is freed
+                evict = []
+                for old_key, old_size in conn.execute('SELECT key, size FROM responses ORDER BY accessed'):
+                    if self._total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    self._total -= old_size
+                conn.executemany('DELETE FROM responses WHERE key=?', evict)
+            conn.commit()
+
+    def clear(self, endpoint=None):
+        '''
+        Remove every stored response, or only those whose endpoint starts with `endpoint`.
+        '''
+        with self._lock:
+            conn = self._connect()
+            if endpoint is None:
+                conn.execute('DELETE FROM responses')
+            else:
+                conn.execute('DELETE FROM responses WHERE endpoint LIKE ?', (endpoint+'%',))
+            conn.commit()
+            self._total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
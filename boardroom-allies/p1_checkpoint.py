@@ -0,0 +1,112 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from p1_cache import canonicalize
+from p1_lazy import LazyModule
+
+# pandas is imported on first use
+pd = LazyModule('pandas')
+
+class RunCheckpoint:
+    '''
+    Run directory where long extractions checkpoint their progress, so an interrupted run can resume.
+    * Every search (query + query_type) gets a folder holding its pages as they arrive and a cursor file
+      with the after_id to continue from, the total count and whether the search finished
+    * Completed per-person lookups are appended to people.jsonl
+    * Files are written before the cursor/line that refers to them, so a crash never leaves a checkpoint
+      pointing at missing data
+
+    Parameters
+    ------------
+    run_dir : str
+        Directory of the checkpoint.
+    resume : bool, default=False
+        Continue from what run_dir holds. If False, any previous checkpoint in run_dir is cleared.
+    '''
+    def __init__(self, run_dir, resume=False):
+        self.run_dir = run_dir
+        self.searches_dir = os.path.join(run_dir, 'searches')
+        self.people_path = os.path.join(run_dir, 'people.jsonl')
+        if not resume:
+            shutil.rmtree(self.searches_dir, ignore_errors=True)
+            if os.path.exists(self.people_path):
+                os.remove(self.people_path)
+        os.makedirs(self.searches_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, query_type):
+        '''
+        Return a stable key for a search, ignoring the pagination cursor.
+        '''
+        query = {k:v for k, v in query.items() if k != 'after_id'}
+        blob = json.dumps([query_type, canonicalize(query)], sort_keys=True, separators=(',', ':'))
+        return query_type+'-'+hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+    def _cursor_path(self, key):
+        return os.path.join(self.searches_dir, key, 'cursor.json')
+
+    def load_search(self, query, query_type):
+        '''
+        Return (pages, after_id, count, done) saved for a search: ([], None, None, False) if there is none.
+        '''
+        key = self.key(query, query_type)
+        try:
+            with open(self._cursor_path(key), 'r') as f:
+                cursor = json.load(f)
+        except FileNotFoundError:
+            return [], None, None, False
+        pages = [pd.read_pickle(os.path.join(self.searches_dir, key, 'page-{:05d}.pkl'.format(i)))
+                 for i in range(cursor['pages'])]
+        return pages, cursor['after_id'], cursor['count'], cursor['done']
+
+    def save_page(self, query, query_type, number, page, after_id, count):
+        '''
+        Store page `number` of a search and move its cursor past it.
+        '''
+        key = self.key(query, query_type)
+        os.makedirs(os.path.join(self.searches_dir, key), exist_ok=True)
+        page.to_pickle(os.path.join(self.searches_dir, key, 'page-{:05d}.pkl'.format(number)))
+        self._write_cursor(key, {'after_id':after_id, 'count':count, 'pages':number+1, 'done':False})
+
+    def finish_search(self, query, query_type, pages, count):
+        '''
+        Mark a search as complete after `pages` pages.
+        '''
+        key = self.key(query, query_type)
+        os.makedirs(os.path.join(self.searches_dir, key), exist_ok=True)
+        self._write_cursor(key, {'after_id':None, 'count':count, 'pages':pages, 'done':True})
+
+    def _write_cursor(self, key, cursor):
+        path = self._cursor_path(key)
+        with open(path+'.tmp', 'w') as f:
+            json.dump(cursor, f)
+        os.replace(path+'.tmp', path)
+
+    def people(self):
+        '''
+        Return {uuid:primary_info result} of the person lookups completed so far.
+        '''
+        done = {}
+        try:
+            with open(self.people_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Line cut short by a crash
+                        continue
+                    done[record['uuid']] = tuple(record['result'])
+        except FileNotFoundError:
+            pass
+        return done
+
+    def save_person(self, person, result):
+        '''
+        Append one completed primary_info lookup.
+        '''
+        line = json.dumps({'uuid':person, 'result':list(result)})+'\n'
+        with self._lock, open(self.people_path, 'a') as f:
+            f.write(line)
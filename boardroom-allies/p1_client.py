@@ -0,0 +1,196 @@
+import time
+import threading
+from concurrent.futures import Future
+from p1_cache import ResponseCache
+from p1_throttle import Throttled
+
+class CrunchbaseClient:
+    '''
+    Crunchbase API client that owns one pooled requests.Session, shared by every endpoint.
+    * Keep-alive connections are reused across calls, so each call skips the TCP+TLS handshake
+    * Responses are requested gzip-compressed
+    * Connection errors and 5xx/429 responses are retried by urllib3 with exponential backoff
+    * Optional response cache (p1_cache.ResponseCache), rate limiter (p1_throttle.TokenBucket)
+      and profiler (p1_profile.Profiler)
+    * Single flight: identical requests made while one is in flight wait for it and share its response
+      instead of calling the API again (counted in `coalesced`)
+
+    Parameters
+    ------------
+    userkey : dict, optional
+        URL parameter holding the Crunchbase API user key. Loaded from user_key.py on the first API call if omitted.
+    cache : ResponseCache, optional
+        Response cache consulted before every network call.
+    limiter : TokenBucket, optional
+        Rate limiter acquired before every network call.
+    profiler : Profiler, optional
+        Records latency, bytes, retries and rate limiter waits of every call.
+    base_url : str, default='https://api.crunchbase.com/api/v4/'
+        Crunchbase API base URL.
+    timeout : float or tuple, default=(10, 60)
+        Connect and read timeouts in seconds.
+    retries : int, default=3
+        Number of urllib3 retries on connection errors and retryable status codes.
+    pool_maxsize : int, default=16
+        Maximum number of pooled connections to the API host. Set at least as high as the number of worker threads.
+    single_flight : bool, default=True
+        Share one API call between identical concurrent requests.
+
+    Attributes
+    ------------
+    coalesced : int
+        Number of API calls saved by single flight.
+    '''
+    def __init__(self, userkey=None, cache=None, limiter=None, base_url='https://api.crunchbase.com/api/v4/',
+                 timeout=(10, 60), retries=3, pool_maxsize=16, profiler=None, single_flight=True):
+        self._userkey = userkey
+        self.cache = cache
+        self.limiter = limiter
+        self.profiler = profiler
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_maxsize = pool_maxsize
+        self.single_flight = single_flight
+        self.coalesced = 0
+        self._session = None
+        self._lock = threading.Lock()
+        # Requests in flight, by cache key
+        self._inflight = {}
+        self._flight_lock = threading.Lock()
+
+    @property
+    def userkey(self):
+        # Read user_key.py on first use, so imports and --help work without a key
+        if self._userkey is None:
+            from user_key import userkey
+            self._userkey = userkey
+        return self._userkey
+
+    @userkey.setter
+    def userkey(self, userkey):
+        self._userkey = userkey
+
+    @property
+    def session(self):
+        # Build the session on first use, so settings changed after construction still apply
+        with self._lock:
+            if self._session is None:
+                self._session = self.make_session()
+        return self._session
+
+    def make_session(self):
+        '''
+        Return a requests.Session with a pooled, retrying adapter and gzip enabled.
+        '''
+        # requests is imported here rather than at the top: it is only needed once the first call goes out
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=self.retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=['GET', 'POST'], respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept-Encoding':'gzip, deflate', 'Accept':'application/json'})
+        return session
+
+    def close(self):
+        '''
+        Close pooled connections. The next request opens a new session.
+        '''
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def request(self, endpoint, params=None, query=None, raw=False, fresh=False):
+        '''
+        Send a request to the Crunchbase API and return the response body.
+        * GET if query is None, otherwise POST with query as json
+        * Only successful responses are stored in the cache, as the bytes received
+        * Raises Throttled on HTTP 429 once urllib3 retries are used up, so callers can back off and retry
+        * A request identical to one in flight (same cache key) waits for that one and gets the same body or exception
+        * fresh=True skips cached responses (the new response is still stored), for results that must be current
+
+        Parameters
+        ------------
+        endpoint : str
+            API path after /api/v4/, e.g. 'searches/jobs', 'autocompletes', 'entities/people/<uuid>'
+        params : dict, optional
+            URL parameters, not including the user key.
+        query : json, optional
+            Input query.
+        raw : bool, default=False
+            Return the undecoded response bytes, for parsers that read bytes directly (skips charset detection).
+        fresh : bool, default=False
+            Call the API even if the response is cached.
+
+        Return
+        ------------
+        text : str or bytes
+            Response body.
+        '''
+        # Look up the canonicalized request in the cache. The user key is left out of the cache key.
+        key = ResponseCache.make_key(endpoint, params, query)
+        if self.cache is not None and not fresh:
+            body = self.cache.get(key, endpoint)
+            if body is not None:
+                if self.profiler is not None:
+                    self.profiler.record_cached(endpoint)
+                return self._as(body, raw)
+        if not self.single_flight:
+            return self._as(self._send(endpoint, params, query, key), raw)
+        # Join an identical request in flight, or lead a new one
+        with self._flight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if self.profiler is not None:
+                self.profiler.record_coalesced(endpoint)
+            return self._as(flight.result(), raw)
+        try:
+            body = self._send(endpoint, params, query, key)
+            flight.set_result(body)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._flight_lock:
+                del self._inflight[key]
+        return self._as(body, raw)
+
+    def _send(self, endpoint, params, query, key):
+        # One API call: rate limit, send, record, cache. Returns the body as bytes.
+        if self.limiter is not None:
+            start = time.perf_counter()
+            self.limiter.acquire()
+            if self.profiler is not None:
+                self.profiler.record_wait(time.perf_counter()-start)
+        method = 'GET' if query is None else 'POST'
+        start = time.perf_counter()
+        r = self.session.request(method, self.base_url+endpoint, params={**self.userkey, **(params or {})},
+                                 json=query, timeout=self.timeout)
+        if self.profiler is not None:
+            # Bytes on the wire (compressed) come from Content-Length; retries from urllib3's retry history
+            history = getattr(getattr(r.raw, 'retries', None), 'history', None) or ()
+            self.profiler.record_call(endpoint, start, time.perf_counter()-start, status=r.status_code,
+                                      nbytes=len(r.content), wire_bytes=int(r.headers.get('Content-Length') or len(r.content)),
+                                      retries=len(history))
+        if r.status_code == 429:
+            raise Throttled('From Crunchbase -- CODE 429: USAGE LIMIT EXCEEDED')
+        if r.status_code == 200 and self.cache is not None:
+            self.cache.set(key, endpoint, r.content)
+        return r.content
+
+    @staticmethod
+    def _as(body, raw):
+        # Cached bodies are bytes (older entries str): convert to what the caller asked for
+        if raw:
+            return body if isinstance(body, bytes) else body.encode('utf-8')
+        return body.decode('utf-8') if isinstance(body, bytes) else body
@@ -1,12 +1,35 @@
-import requests
 import json
-from json import JSONDecodeError
-import pandas as pd
-from pandas import json_normalize
-from user_key import userkey
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from p1_cache import ResponseCache
+from p1_client import CrunchbaseClient
+from p1_throttle import TokenBucket, with_backoff
+from p1_profile import profiler
+from p1_queries import makequery_people
+from p1_lazy import LazyModule
+
+# pandas is imported on first use
+pd = LazyModule('pandas')
+
+# Faster JSON backend when installed. Both parse response bytes directly.
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+# On-disk response cache shared by every API call (see p1_cache.ResponseCache for bypass/refresh switches)
+cache = ResponseCache()
+
+# Token bucket shared by every API call, tuned to the API key quota of 200 calls per minute
+limiter = TokenBucket(rate=200/60)
+
+# Pooled HTTP client that every endpoint goes through (the profiler only records once enabled).
+# The API key is read from user_key.py on the first call.
+client = CrunchbaseClient(cache=cache, limiter=limiter, profiler=profiler)
 
 # Column/field mapper dictionnairies
 column_mapper = {'properties.organization_identifier.value':'company',
+                 'properties.organization_identifier.uuid':'company_uuid',
                  'properties.person_identifier.value':'person',
                  'properties.person_identifier.uuid':'person_uuid',
                  'properties.title':'title',
@@ -34,9 +57,38 @@ order_abbrev = ['Grant','Pre Seed', 'Seed','A','B','C','D','E','F','G','H','I','
                 'Venture Rnd', 'Corporate Rnd', 'Non Equity Assist', 'Convert Note',
                 'Post-IPO Equity','']
 
+# Columns pulled out of each page by fetch_page, per query type, named like json_normalize names them.
+# Query types not listed here are sent through json_normalize.
+identifier_keys = ['uuid','value','permalink','entity_def_id']
+projections = {'jobs':['uuid',
+                       *['properties.identifier.'+key for key in identifier_keys],
+                       'properties.organization_identifier.uuid','properties.organization_identifier.value',
+                       'properties.person_identifier.uuid','properties.person_identifier.value',
+                       'properties.entity_def_id','properties.name','properties.short_description',
+                       'properties.job_type','properties.is_current','properties.title','properties.employee_featured_order',
+                       'properties.started_on.value','properties.ended_on.value','properties.updated_at'],
+               'investments':['uuid',
+                              *['properties.identifier.'+key for key in identifier_keys],
+                              'properties.name',
+                              'properties.organization_identifier.uuid','properties.organization_identifier.value',
+                              'properties.investor_identifier.uuid','properties.investor_identifier.value',
+                              'properties.partner_identifiers','properties.updated_at'],
+               'people':['uuid',
+                         *['properties.identifier.'+key for key in identifier_keys],
+                         'properties.primary_job_title',
+                         'properties.primary_organization.uuid','properties.primary_organization.value',
+                         'properties.linkedin.value','properties.updated_at']}
+
 abbrev_mapper = dict(zip(order,order_abbrev))
 order_mapper = {key:i for i,key in enumerate(order)}
 
+def api_request(endpoint, params=None, query=None, raw=False, fresh=False):
+    '''
+    Send a request to the Crunchbase API through the module-level client and return the response body.
+    * See p1_client.CrunchbaseClient.request
+    '''
+    return client.request(endpoint, params=params, query=query, raw=raw, fresh=fresh)
+
 def url_count(query, query_type):
     '''
     Return the total number of results of a query.
@@ -57,14 +109,39 @@ def url_count(query, query_type):
         Count of results.
     '''
     # POST method with Crunchbase API URL and query_type as a parameter, and passing query as json.
-    r = requests.post('https://api.crunchbase.com/api/v4/searches/'+query_type,params=userkey,json=query)
-    count = json.loads(r.text)['count']
+    count = loads(api_request('searches/'+query_type, query=query, raw=True))['count']
     return count
 
-def url_extraction(query, query_type, raw):
+def project(entities, columns):
     '''
-    Return the results for a query, deserialize to a Python dictionary object, and transform into pandas DataFrame.
-    * Appends the results of the query to the global dataframe variable, raw
+    Return a DataFrame with one column per dotted path, e.g. 'properties.organization_identifier.value'.
+    * Walks each entity once per column instead of flattening every nested field like json_normalize
+    * Missing fields are None; lists (e.g. partner_identifiers) are kept as-is
+
+    Parameters
+    ------------
+    entities : list
+        Decoded 'entities' of a search page.
+    columns : list
+        Dotted column names, as json_normalize would name them.
+    '''
+    data = {}
+    for col in columns:
+        path = col.split('.')
+        values = []
+        for entity in entities:
+            for key in path:
+                entity = entity.get(key) if isinstance(entity, dict) else None
+            values.append(entity)
+        data[col] = values
+    return pd.DataFrame(data, columns=columns)
+
+def fetch_page(query, query_type, normalize=False, fresh=False):
+    '''
+    Return the total result count and one page of results for a query, as a pandas DataFrame.
+    * The response bytes are decoded once (with orjson when installed)
+    * Query types listed in projections only keep their listed columns; pass normalize=True
+      to get every field through json_normalize instead
 
     Parameters
     ------------
@@ -75,27 +152,43 @@ def url_extraction(query, query_type, raw):
         organizations, people, funding_rounds, acquisitions, investments, events, press_references,
         funds, event_appearances, ipos, ownerships, categories, category_groups, locations, jobs,
         key_employee_changes, addresses, degrees, principals
+    normalize : bool, default=False
+        Flatten every field with json_normalize.
+    fresh : bool, default=False
+        Skip the response cache, e.g. for updated_since queries whose results change between runs.
+
+    Return
+    ------------
+    count : int
+        Count of results of the whole search.
+    page : pandas.core.frame.DataFrame
+        Entities of the page.
     '''
-    # Create global raw variable. This ensures that it can be updated if the API call needs to loop.
     # POST method with API URL, query_type as a parameter, and passing query as json.
-    r = requests.post('https://api.crunchbase.com/api/v4/searches/'+query_type, params=userkey, json=query)
-    # Return results of query
-    result = json.loads(r.text)
-    # Normalize semi-structured JSON data into a flat table, forcing it to fit into a relational data structure.
-    try:
-        normalized_raw = json_normalize(result['entities'])
-    except TypeError:
+    result = loads(api_request('searches/'+query_type, query=query, raw=True, fresh=fresh))
+    # Crunchbase errors come back as a list of {code, message}
+    if isinstance(result, list):
         error_string = 'From Crunchbase -- CODE {}: {}'.format(result[0]['code'].upper(),result[0]['message'].upper())
         raise TypeError(error_string)
-    # Append normalized entity results to global raw variable
-    raw = raw.append(normalized_raw, ignore_index=True)
-    return raw
+    if normalize or query_type not in projections:
+        # Normalize semi-structured JSON data into a flat table, forcing it to fit into a relational data structure.
+        page = pd.json_normalize(result['entities'])
+    else:
+        page = project(result['entities'], projections[query_type])
+    return result['count'], page
 
-def go_past_1000(query, query_type, count, raw):
+def extract_page(query, query_type, normalize=False):
     '''
-    This sets up a while loop to go past the Crunchbase API POST limit of returning only 1000 results.
-    * While loop continues until it reaches the total result count.
-    * Appends the results of each loop to the global dataframe variable, raw.
+    Return one page of results for a query, deserialized into a pandas DataFrame.
+    * See fetch_page for parameters
+    '''
+    return fetch_page(query, query_type, normalize=normalize)[1]
+
+def url_extraction(query, query_type, raw):
+    '''
+    Return the results for a query, deserialize to a Python dictionary object, and transform into pandas DataFrame.
+    * Returns raw with the results of the query appended
+    * Copies raw on every call; to page through a search use go_past_1000, which concatenates once
 
     Parameters
     ------------
@@ -106,36 +199,236 @@ def go_past_1000(query, query_type, count, raw):
         organizations, people, funding_rounds, acquisitions, investments, events, press_references,
         funds, event_appearances, ipos, ownerships, categories, category_groups, locations, jobs,
         key_employee_changes, addresses, degrees, principals
-    count : int
-        Value output from url_count function
+    raw : pandas.core.frame.DataFrame
+        Results so far.
+    '''
+    return pd.concat([raw, extract_page(query, query_type)], ignore_index=True)
+
+def iter_search(query, query_type, count=None, sink=None, normalize=False, checkpoint=None, fresh=False):
     '''
-    # Query loop starts
+    Generator that pages through a search and yields each normalized page as it arrives.
+    * The total count is read from the first page, so no separate url_count call is needed
+    * Memory stays bounded by one page; pass a ParquetSink to also append every page to disk
+    * Throttled pages are retried with with_backoff, like person lookups, instead of aborting the search
+
+    Parameters
+    ------------
+    query : json
+        Input query.
+    query_type : str
+        One of the types of accepted Crunchbase API searches:
+        organizations, people, funding_rounds, acquisitions, investments, events, press_references,
+        funds, event_appearances, ipos, ownerships, categories, category_groups, locations, jobs,
+        key_employee_changes, addresses, degrees, principals
+    count : int, optional
+        Value output from url_count function. Read from the first page if not given.
+    sink : ParquetSink, optional
+        Receives every page through sink.write(page).
+    normalize : bool, default=False
+        Flatten every field with json_normalize instead of the query type's projection (see fetch_page).
+    checkpoint : RunCheckpoint, optional
+        Saves every page and the after_id cursor to a run directory. Pages saved by an interrupted run
+        are yielded again from disk and paging continues from the saved cursor.
+    fresh : bool, default=False
+        Fetch every page from the API instead of the response cache (see fetch_page).
+
+    Yield
+    ------------
+    page : pandas.core.frame.DataFrame
+        Normalized entities of one page.
+    '''
+    # Removes after_id in case its there before the query starts.
+    query.pop('after_id', None)
     data_acq = 0
-    while data_acq < count:
-        if data_acq != 0:
-            # Selects the most recently added result
-            last_uuid = raw.uuid[len(raw.uuid)-1]
-            # Saves most recent uuid query so POST request starts after this one
-            query['after_id'] = last_uuid
-            # Extracts data
-            raw = url_extraction(query, query_type, raw)
+    pages = 0
+    # Replay the pages a previous run already saved
+    if checkpoint is not None:
+        saved, after_id, saved_count, done = checkpoint.load_search(query, query_type)
+        for page in saved:
+            if sink is not None:
+                sink.write(page)
+            yield page
+            data_acq += len(page)
+        pages = len(saved)
+        if done:
+            return
+        if count is None:
+            count = saved_count
+        if after_id is not None:
+            query['after_id'] = after_id
+    try:
+        while count is None or data_acq < count:
+            # Extracts data, backing off while Crunchbase throttles (query is only changed after a page arrives)
+            page_count, page = with_backoff(fetch_page, query, query_type, normalize=normalize, fresh=fresh)
+            if count is None:
+                count = page_count
+            # Stop if Crunchbase runs out of results before reaching count
+            if page.empty:
+                break
+            if sink is not None:
+                sink.write(page)
             # Updates data_acq variable
-            data_acq = len(raw.uuid)
-        else:
-            # Removes after_id in case its there before the query starts.
-            if 'after_id' in query:
-                query = query.pop('after_id')
-                # Extracts data
-                raw = url_extraction(query, query_type, raw)
-                # Updates data_acq variable
-                data_acq = len(raw.uuid)
-            # Starting query loop
-            else:
-                # Extracts data
-                raw = url_extraction(query, query_type, raw)
-                # Updates data_acq variable
-                data_acq = len(raw.uuid)
-    return raw
+            data_acq += len(page)
+            # Saves most recent uuid so the next POST request starts after this one
+            query['after_id'] = page['uuid'].iloc[-1]
+            # Checkpoint the page before handing it out
+            if checkpoint is not None:
+                checkpoint.save_page(query, query_type, pages, page, query['after_id'], count)
+            pages += 1
+            yield page
+        if checkpoint is not None:
+            checkpoint.finish_search(query, query_type, pages, count)
+    finally:
+        query.pop('after_id', None)
+
+def go_past_1000(query, query_type, count, raw, normalize=False, checkpoint=None, fresh=False):
+    '''
+    This sets up a while loop to go past the Crunchbase API POST limit of returning only 1000 results.
+    * While loop continues until it reaches the total result count.
+    * Pages from iter_search are collected in a list and concatenated onto raw once at the end.
+
+    Parameters
+    ------------
+    query : json
+        Input query.
+    query_type : str
+        One of the types of accepted Crunchbase API searches:
+        organizations, people, funding_rounds, acquisitions, investments, events, press_references,
+        funds, event_appearances, ipos, ownerships, categories, category_groups, locations, jobs,
+        key_employee_changes, addresses, degrees, principals
+    count : int or None
+        Value output from url_count function. If None, read from the first page.
+    raw : pandas.core.frame.DataFrame
+        Results so far, usually an empty DataFrame.
+    normalize : bool, default=False
+        Flatten every field with json_normalize instead of the query type's projection (see fetch_page).
+    checkpoint : RunCheckpoint, optional
+        Checkpoint pages to a run directory and resume from it (see iter_search).
+    fresh : bool, default=False
+        Fetch every page from the API instead of the response cache (see fetch_page).
+    '''
+    pages = [raw] if not raw.empty else []
+    pages.extend(iter_search(query, query_type, count, normalize=normalize, checkpoint=checkpoint, fresh=fresh))
+    if not pages:
+        return raw
+    return pd.concat(pages, ignore_index=True)
+
+def sharded_search(make_query, uuid_lst, query_type, shard_size=100, workers=4, search=None):
+    '''
+    Split a uuid list into shards, page through each shard's search concurrently, and concatenate the results.
+    * Keeps each request small and runs one after_id cursor per shard instead of one for the whole list
+    * Shards are disjoint, so the merged results contain no duplicates
+
+    Parameters
+    ------------
+    make_query : function
+        Query builder taking a uuid list, e.g. makequery_board_affiliations, makequery_investors, makequery_people.
+    uuid_lst : list
+        Input uuids.
+    query_type : str
+        One of the types of accepted Crunchbase API searches, e.g. jobs, investments, people
+    shard_size : int, default=100
+        Number of uuids per query.
+    workers : int, default=4
+        Maximum number of shards paged at the same time.
+    search : function, optional
+        Called as search(query, query_type) to page through one shard. Defaults to go_past_1000.
+
+    Return
+    ------------
+    raw : pandas.core.frame.DataFrame
+        Normalized results of every shard, in shard order.
+    '''
+    if type(uuid_lst)!=list and type(uuid_lst)==str:
+        uuid_lst = [uuid_lst]
+    if search is None:
+        search = lambda query, query_type: go_past_1000(query, query_type, None, pd.DataFrame())
+    shards = [list(uuid_lst[i:i+shard_size]) for i in range(0, len(uuid_lst), shard_size)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pages = list(executor.map(lambda shard: search(make_query(shard), query_type), shards))
+    pages = [page for page in pages if not page.empty]
+    if not pages:
+        return pd.DataFrame()
+    return pd.concat(pages, ignore_index=True)
+
+class ParquetSink:
+    '''
+    Appends normalized search pages to a single Parquet file, for use with iter_search.
+    * Requires pyarrow
+    * Columns that are all null so far have no type yet: pages are held back (up to buffer_rows rows) until
+      every column has a concrete type, and their schemas are unified with pyarrow.unify_schemas
+    * The schema is fixed once the file is opened: later pages are cast to it, columns missing from them are
+      written as nulls, columns that only appear in them are dropped, and columns that were still all null
+      when the file opened are stored as strings
+    * Use as a context manager, or call close() to finish the file
+
+    Parameters
+    ------------
+    path : str
+        Output .parquet file.
+    buffer_rows : int, default=100000
+        Maximum number of rows held back while some columns are still all null.
+    '''
+    def __init__(self, path, buffer_rows=100000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('ParquetSink requires pyarrow: pip install pyarrow')
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.buffer_rows = buffer_rows
+        self.schema = None
+        self.writer = None
+        self.rows = 0
+        self._pending = []
+
+    def write(self, page):
+        table = self.pa.Table.from_pandas(page, preserve_index=False)
+        self.rows += len(page)
+        if self.writer is not None:
+            self.writer.write_table(self._conform(table))
+            return
+        self._pending.append(table)
+        schema = self._unified()
+        # Wait for a page that gives the all-null columns a type
+        if any(self.pa.types.is_null(f.type) for f in schema) and \
+                sum(t.num_rows for t in self._pending) < self.buffer_rows:
+            return
+        self._open(schema)
+
+    def _unified(self):
+        # Null fields unify with any concrete type found on another page
+        return self.pa.unify_schemas([t.schema.remove_metadata() for t in self._pending])
+
+    def _open(self, schema):
+        pa = self.pa
+        self.schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+        self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        for table in self._pending:
+            self.writer.write_table(self._conform(table))
+        self._pending = []
+
+    def _conform(self, table):
+        # Cast a page to the file schema, filling missing columns with nulls
+        pa = self.pa
+        columns = [table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(table.num_rows, f.type)
+                   for f in self.schema]
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def close(self):
+        if self.writer is None and self._pending:
+            self._open(self._unified())
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 def autocompletes(search_input, collection_ids=None, limit=10, verbose=False):
     '''
@@ -162,18 +455,16 @@ def autocompletes(search_input, collection_ids=None, limit=10, verbose=False):
     '''
     if type(collection_ids)!=list and type(collection_ids)==str:
         collection_ids = [collection_ids]
-    # Create parameter dictionary to pass into POST method
-    params = {**userkey, 'query':search_input}
+    # Create parameter dictionary to pass into GET method
+    params = {'query':search_input}
     # Add input collection ids to parameters dictionary
     if collection_ids and type(collection_ids)==list:
         params.update({'collection_ids':','.join(collection_ids)})
     # Add input limit to parameters dictionary
     if limit and type(limit)==int:
         params.update({'limit':limit})
-    # POST method with API URL, query_type as a parameter, and passing query as json.
-    r = requests.get('https://api.crunchbase.com/api/v4/autocompletes', params=params)
-    # Return results of query
-    result = json.loads(r.text)['entities'][0]
+    # GET method with API URL, passing search input and collection ids as parameters.
+    result = loads(api_request('autocompletes', params=params, raw=True))['entities'][0]
     # Normalize semi-structured JSON data into a flat table, forcing it to fit into a relational data structure.
     #normalized_result = json_normalize(result['entities'])
     # Return results of autocompletes query as pandas dataframe
@@ -219,18 +510,16 @@ def primary_info(person_id, field_ids=['primary_job_title','primary_organization
         Dictionary mapper of uuid to the individual's LinkedIn
 
     '''
-    # Create parameter dictionary to pass into POST method
-    params = {**userkey}
+    # Create parameter dictionary to pass into GET method
+    params = {}
     # Add input field ids to parameters dictionary
     if field_ids and type(field_ids)==list:
         params.update({'field_ids':','.join(field_ids)})
     # Add input cards ids to parameters dictionary
     if card_ids and type(card_ids)==list:
         params.update({'card_ids':','.join(card_ids)})
-    # POST method with API URL, query_type as a parameter, and passing query as json.
-    r = requests.get('https://api.crunchbase.com/api/v4/entities/people/'+person_id, params=params)
-    # Return results of query
-    result = json.loads(r.text)
+    # GET method with API URL and person id
+    result = loads(api_request('entities/people/'+person_id, params=params, raw=True))
     # Pull uuid of searched individual
     uuid = result['properties']['identifier']['uuid']
     name = result['properties']['identifier']['value']
@@ -256,7 +545,30 @@ def primary_info(person_id, field_ids=['primary_job_title','primary_organization
         org_uuid = 'NA'
     return {uuid:name}, {uuid:title}, {uuid:org}, {uuid:org_uuid}, {uuid:linkedin}
 
-def primary_info_of_people(person_uuids):
+def primary_info_of_people(person_uuids, workers=8, verbose=True, checkpoint=None):
+    '''
+    Run primary_info for a list of individuals concurrently and merge the results.
+    * Calls are spread over a thread pool and paced by the module-level token bucket, limiter
+    * Throttled calls are retried with exponential backoff
+    * With a checkpoint, every completed lookup is saved as it finishes and lookups saved by a previous run are reused
+
+    Parameters
+    ------------
+    person_uuids : list
+        uuids or permalinks of individuals
+    workers : int, default=8
+        Maximum number of requests in flight.
+    verbose : bool, default=True
+        Print a progress counter and a summary of missing fields.
+    checkpoint : RunCheckpoint, optional
+        Run directory where completed lookups are saved.
+
+    Return
+    ------------
+    Same five dictionaries as primary_info, merged over all individuals:
+    {uuid:name}, {uuid:title}, {uuid:org}, {uuid:org_uuid}, {uuid:linkedin}
+    * Entries equal to 'NA' are left out of the title, org, org_uuid, and LinkedIn dictionaries
+    '''
     # Start with empty dictionnaries
     all_names = {}
     all_titles = {}
@@ -264,113 +576,177 @@ def primary_info_of_people(person_uuids):
     all_orgs_uuid = {}
     all_linkedin = {}
     no_primary_info = []
-    # For each API call, update dictionary if it's not empty
-    i = 0
-    print('Count of primary_info API calls, number of unique individuals found in query:')
-    while i < len(person_uuids):
-        print(i+1, end=' ')
-        person = person_uuids[i]
-        try:
-            # API Call
-            name,primary_job_title,primary_org,primary_org_uuid,linkedin = primary_info(person)
-            all_names.update(name)
-            # Update job title dictionary as long as its not equal to 'NA'
-            if primary_job_title[person] != 'NA':
-                all_titles.update(primary_job_title)
-            # Update organization dictionary as long as its not equal to 'NA'
-            if primary_org[person] != 'NA':
-                all_orgs.update(primary_org)
-            # Update organization dictionary as long as its not equal to 'NA'
-            if primary_org_uuid[person] != 'NA':
-                all_orgs_uuid.update(primary_org_uuid)
-            # Update LinkedIn dictionary as long as its not equal to 'NA'
-            if linkedin[person] != 'NA':
-                all_linkedin.update(linkedin)
-            # If any are equal to 'NA', store in no_primary_info list for safekeeping.
-            if primary_job_title[person] == 'NA' or primary_org[person] == 'NA' or linkedin[person] == 'NA' or primary_org_uuid[person] =='NA':
-                no_primary_info.append(person)
-            # Continue looping
-            i += 1
-        except JSONDecodeError:
-            print('[From Crunchbase: Usage limit exceeded. Pause for 5 seconds and continue.]',end =' ')
-            time.sleep(5)
+    if verbose:
+        print('Count of primary_info API calls, number of unique individuals found in query:')
+    # Lookups completed by a previous run
+    done = checkpoint.people() if checkpoint is not None else {}
+    def save(future, person):
+        # Checkpoint each lookup as soon as it completes
+        if future.exception() is None:
+            checkpoint.save_person(person, future.result())
+    # Submit one backoff-wrapped API call per person not looked up yet
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for person in person_uuids:
+            if person in done or person in futures:
+                continue
+            futures[person] = executor.submit(with_backoff, primary_info, person, verbose=verbose)
+            if checkpoint is not None:
+                futures[person].add_done_callback(lambda future, person=person: save(future, person))
+        if verbose:
+            for i, _ in enumerate(as_completed(futures.values())):
+                print(i+1, end=' ')
+    # Merge in input order, so dictionaries come out the same as a sequential run
+    for person in person_uuids:
+        result = done[person] if person in done else futures[person].result()
+        name,primary_job_title,primary_org,primary_org_uuid,linkedin = result
+        all_names.update(name)
+        # Update job title dictionary as long as its not equal to 'NA'
+        if primary_job_title[person] != 'NA':
+            all_titles.update(primary_job_title)
+        # Update organization dictionary as long as its not equal to 'NA'
+        if primary_org[person] != 'NA':
+            all_orgs.update(primary_org)
+        # Update organization dictionary as long as its not equal to 'NA'
+        if primary_org_uuid[person] != 'NA':
+            all_orgs_uuid.update(primary_org_uuid)
+        # Update LinkedIn dictionary as long as its not equal to 'NA'
+        if linkedin[person] != 'NA':
+            all_linkedin.update(linkedin)
+        # If any are equal to 'NA', store in no_primary_info list for safekeeping.
+        if primary_job_title[person] == 'NA' or primary_org[person] == 'NA' or linkedin[person] == 'NA' or primary_org_uuid[person] =='NA':
+            no_primary_info.append(person)
     # Count of how many are missing Title, Organization, or LinkedIn
-    print('\n\n{} out of {} records are missing either a primary job title, primary organization, or LinkedIn url.\n'.format(len(no_primary_info),i))
+    if verbose:
+        print('\n\n{} out of {} records are missing either a primary job title, primary organization, or LinkedIn url.\n'.format(len(no_primary_info),len(person_uuids)))
+    return all_names, all_titles, all_orgs, all_orgs_uuid, all_linkedin
+
+def primary_info_bulk(person_uuids, batch_size=1000, workers=4, verbose=True, checkpoint=None):
+    '''
+    Get the primary job title, organization, and LinkedIn url of many individuals through the searches/people endpoint.
+    * Puts up to batch_size uuids in each query instead of one entities/people GET per person
+    * Batches are paged with go_past_1000, several at a time through sharded_search
+
+    Parameters
+    ------------
+    person_uuids : list
+        uuids of individuals
+    batch_size : int, default=1000
+        Number of uuids per query.
+    workers : int, default=4
+        Maximum number of batches paged at the same time.
+    verbose : bool, default=True
+        Print a summary of missing fields.
+    checkpoint : RunCheckpoint, optional
+        Checkpoint the pages of every batch to a run directory and resume from it (see iter_search).
+
+    Return
+    ------------
+    Same five dictionaries as primary_info_of_people:
+    {uuid:name}, {uuid:title}, {uuid:org}, {uuid:org_uuid}, {uuid:linkedin}
+    * Missing fields are left out of the title, org, org_uuid, and LinkedIn dictionaries
+    '''
+    fields = {'properties.identifier.value':{},
+              'properties.primary_job_title':{},
+              'properties.primary_organization.value':{},
+              'properties.primary_organization.uuid':{},
+              'properties.linkedin.value':{}}
+    # Run one people search per batch of uuids, several batches at a time
+    raw = sharded_search(lambda batch: makequery_people(batch, limit=min(batch_size, 1000)), list(person_uuids), 'people',
+                         shard_size=batch_size, workers=workers,
+                         search=lambda query, query_type: go_past_1000(query, query_type, None, pd.DataFrame(),
+                                                                       checkpoint=checkpoint))
+    # Map uuid to each field, skipping individuals without a value
+    for col, mapper in fields.items():
+        if col in raw.columns:
+            found = raw[['properties.identifier.uuid', col]].dropna()
+            mapper.update(zip(found['properties.identifier.uuid'], found[col]))
+    all_names, all_titles, all_orgs, all_orgs_uuid, all_linkedin = fields.values()
+    # Count of how many are missing Title, Organization, or LinkedIn
+    if verbose:
+        missing = sum(1 for person in person_uuids
+                      if person not in all_titles or person not in all_orgs or person not in all_orgs_uuid or person not in all_linkedin)
+        print('\n{} out of {} records are missing either a primary job title, primary organization, or LinkedIn url.\n'.format(missing,len(person_uuids)))
     return all_names, all_titles, all_orgs, all_orgs_uuid, all_linkedin
 
 def create_board_strings(lst_of_frames, company_names):
+    '''
+    Build one dictionary per frame mapping each company to its concatenated board string.
+    * 'Name1 (Primary Org1); Name2; Name3 (Primary Org3)', sorted by name, with commas removed
+    * If a person is listed more than once for a company, their last primary_org is used
+    * Companies without affiliations map to ''
+    * Each frame is handled in one groupby pass instead of filtering it per company
+
+    Parameters
+    ------------
+    lst_of_frames : list
+        DataFrames with company, person and primary_org columns.
+    company_names : list
+        Companies to include in every dictionary.
+
+    Return
+    ------------
+    all_dict : list
+        One {company:board_string} dictionary per frame.
+    '''
     # For saving to csv
     all_dict = []
     for df in lst_of_frames:
-        # Fill in affiliation dictionary
-        people_dict = {}
-        # For each company
-        for org in company_names:
-            # Filter df to unique company affiliations
-            temp_df = df[df['company']==org]
-            # Collapse individual names to list
-            names = temp_df['person'].to_list()
-            # Collapse individual organizations to list
-            companies = temp_df['primary_org'].to_list()
-            # Start with empty string
-            board_string = ''
-            # Exclude if there are no individuals affiliated
-            if names != []:
-                # Make temp dictionary of name:org
-                board_info = dict(zip(names, companies))
-                # Add them to string
-                for name, company in sorted(board_info.items()):
-                    # If individual does not have a primary organization
-                    if pd.isna(company):
-                        board_string += name +'; '
-                    # If individual has a primary organziation, place into parentheses
-                    else:
-                        board_string += name+' ('+company+'); '
-                # Remove trailing semicolon and remove extra commas
-                board_string = board_string[:-2].replace(',', '')
-            # Add string to main dictionary
-            people_dict[org] = board_string
-        all_dict.append(people_dict)
+        # Keep the companies of interest and one row per person per company (last one wins)
+        sub = df.loc[df['company'].isin(company_names), ['company','person','primary_org']]
+        sub = sub.drop_duplicates(['company','person'], keep='last').sort_values(['company','person'])
+        person = sub['person'].astype(object)
+        primary_org = sub['primary_org'].astype(object)
+        # If individual has a primary organziation, place into parentheses
+        entries = person.where(primary_org.isna(), person+' ('+primary_org+')')
+        # Join per company and remove extra commas
+        board_strings = entries.groupby(sub['company'].astype(object), sort=False).agg('; '.join).str.replace(',', '', regex=False)
+        # Add string to main dictionary
+        board_strings = board_strings.to_dict()
+        all_dict.append({org:board_strings.get(org, '') for org in company_names})
     return all_dict
 
 def create_investor_strings(frame):
-    all_investors = {}
-    for co in frame.company.unique():
-        investor_str = ''
-        # Create sub-DF with just the company's investors
-        co_df = frame[frame['company']==co]
-        # Turn into list
-        co_investors = sorted(list(set(co_df['investor_name'].to_list())))
-        for inv in co_investors:
-            # Add investor to string
-            investor_str += inv+'; '
-        # Remove trailing semicolon
-        investor_str = investor_str[:-2]
-        all_investors[co] = investor_str
-
-    all_investors_w_info = {}
-    for co in frame.company.unique():
-        investor_str = ''
-        # Create sub-DF with just the company's investors
-        co_df = frame[frame['company']==co]
-        # Create unique list of investment types
-        lst = list(set(co_df['type'].to_list()))
-        lst = sorted(lst, key=lambda d:order_mapper[d])
-        for item in lst:
-            # Create sub-list of investors with a particular investment type
-            investor_type_lst = sorted(list(set(co_df['investor_name'][co_df['type']==item].to_list())))
-            if investor_type_lst != []:
-                # Add investment type to string
-                investor_str += item + ' ('
-                for com in investor_type_lst:
-                    # Add investor to string
-                    investor_str += com + '; '
-                # Remove trailing semicolon and add end parenthesis
-                investor_str = investor_str[:-2]
-                investor_str += ') | '
-        # Remove trailing characters
-        investor_str = investor_str[:-3]
-        all_investors_w_info[co] = investor_str
+    '''
+    Build the investor strings of every company in one grouped aggregation.
+    * Round types are ordered with an ordered categorical built from `order`
+    * Round types missing from `order` go after the known ones, alphabetically
+
+    Parameters
+    ------------
+    frame : pandas.core.frame.DataFrame
+        Investments with company, type and investor_name columns.
+
+    Return
+    ------------
+    all_investors : dict
+        {company:'Investor1; Investor2; ...'}, investors sorted by name
+    all_investors_w_info : dict
+        {company:'Seed Round (Investor1; Investor2) | Series A (Investor3)'}, rounds sorted by `order`
+    '''
+    companies = frame['company'].unique()
+    if len(companies) == 0:
+        return {}, {}
+    # One row per company, round type and investor
+    sub = frame[['company','type','investor_name']].astype(object).fillna({'type':''}).drop_duplicates()
+    # Ordered categoricals: companies in order of appearance, round types in funding order
+    extra_types = sorted(set(sub['type']) - set(order))
+    sub['company'] = pd.Categorical(sub['company'], categories=companies, ordered=True)
+    sub['type'] = pd.Categorical(sub['type'], categories=order+extra_types, ordered=True)
+    sub = sub.sort_values(['company','type','investor_name'])
+
+    # Unique investors per company, sorted by name
+    by_investor = sub.drop_duplicates(['company','investor_name']).sort_values(['company','investor_name'])
+    all_investors = by_investor.groupby('company', sort=False, observed=True)['investor_name'].agg('; '.join).to_dict()
+
+    # Investors per round type, then round types per company
+    by_type = sub.groupby(['company','type'], sort=False, observed=True)['investor_name'].agg('; '.join)
+    round_strings = by_type.index.get_level_values('type').astype(object)+' ('+by_type+')'
+    all_investors_w_info = round_strings.groupby(level='company', sort=False, observed=True).agg(' | '.join).to_dict()
+
+    # Keep the order in which companies appear in frame
+    all_investors = {co:all_investors[co] for co in companies}
+    all_investors_w_info = {co:all_investors_w_info[co] for co in companies}
     return all_investors, all_investors_w_info
 
 
@@ -437,3 +813,83 @@ def whoKnows(name, df, person_first=True):
     # Remove extra space and comma
     matches_str = matches_str[:-2]
     return matches_str
+
+
+class AffiliationIndex:
+    '''
+    Person<->company index built once from a dataframe generated by the url_extraction(query, "jobs") function,
+    so that whoKnows-style lookups cost O(degree) instead of a scan of the whole dataframe.
+    * Accepts raw column names or names already sent through column_mapper
+
+    Parameters
+    ------------
+    df : pandas.core.frame.DataFrame
+        Jobs extraction.
+
+    Attributes
+    ------------
+    person_companies : dict
+        {person:[company, ...]} unique companies of each person, in row order
+    company_people : dict
+        {company:[person, ...]} people of each company, one entry per row
+    '''
+    def __init__(self, df):
+        person_col = 'person' if 'person' in df.columns else 'properties.person_identifier.value'
+        company_col = 'company' if 'company' in df.columns else 'properties.organization_identifier.value'
+        self.person_companies = {}
+        self.company_people = {}
+        for person, company in zip(df[person_col].to_list(), df[company_col].to_list()):
+            # Skip rows without a person or company
+            if pd.isna(person) or pd.isna(company):
+                continue
+            companies = self.person_companies.setdefault(person, [])
+            if company not in companies:
+                companies.append(company)
+            self.company_people.setdefault(company, []).append(person)
+
+    def who_knows(self, name, person_first=True):
+        '''
+        Same output as whoKnows(name, df, person_first), answered from the index.
+
+        If person_first is True (default), the output will aggregate by person.
+        matches_str = 'Name1 (Company1, Company), Name2 (Company2), Name3 (Company1), ...'
+
+        If person_first is False, the output will aggregate by company
+        matches_str = 'Company1 (Name1, Name2, Name3), Company2 (Name1), Company3 (Name2, Name3), ...'
+        '''
+        if name not in self.person_companies:
+            return "There's no one in this list by that name. Check for typos!"
+        matches_dict = {}
+        # Walk the person's companies in alphabetical order, like whoKnows' sort by company
+        for company in sorted(self.person_companies[name]):
+            for person in self.company_people[company]:
+                # Remove the person from the results
+                if person == name:
+                    continue
+                if person_first:
+                    matches_dict.setdefault(person, []).append(company)
+                else:
+                    matches_dict.setdefault(company, []).append(person)
+        return ', '.join('{} ({})'.format(key, ', '.join(value)) for key, value in matches_dict.items())
+
+    def who_knows_many(self, names, person_first=True):
+        '''
+        Run who_knows for every name in names.
+
+        Return
+        ------------
+        matches : dict
+            {name:matches_str}
+        '''
+        return {name:self.who_knows(name, person_first) for name in names}
+
+def who_knows_many(names, df, person_first=True):
+    '''
+    Bulk version of whoKnows: builds one AffiliationIndex from df and answers every name in names from it.
+
+    Return
+    ------------
+    matches : dict
+        {name:matches_str}
+    '''
+    return AffiliationIndex(df).who_knows_many(names, person_first)
@@ -0,0 +1,244 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from p1_crunchbase import column_mapper
+
+def to_edges(df, actor_uuid, actor_name):
+    '''
+    Return (actor_id, actor_name, company_id, company_name) edges from a jobs or investments extraction.
+    * Accepts raw column names or names already sent through column_mapper
+    * Nodes are keyed by uuid when the uuid column is present, otherwise by name
+
+    Parameters
+    ------------
+    df : pandas.core.frame.DataFrame
+        Jobs or investments extraction.
+    actor_uuid : str
+        Renamed uuid column of the person/investor, e.g. 'person_uuid' or 'investor_uuid'.
+    actor_name : str
+        Renamed name column of the person/investor, e.g. 'person' or 'investor_name'.
+    '''
+    df = df.rename(column_mapper, axis=1)
+    cols = {}
+    cols['actor_name'] = df[actor_name]
+    cols['actor'] = df[actor_uuid] if actor_uuid in df.columns else df[actor_name]
+    cols['company_name'] = df['company']
+    cols['company'] = df['company_uuid'] if 'company_uuid' in df.columns else df['company']
+    edges = pd.DataFrame({key:col.astype(object).to_numpy() for key, col in cols.items()})
+    return edges.dropna(subset=['actor','company'])
+
+class AffiliationGraph:
+    '''
+    Sparse co-affiliation graph over board affiliations and investments.
+    * Actors (board members and investors, merged by uuid) form the rows of a sparse actor x company matrix
+    * Co-board and co-investment adjacency are sparse matrix products
+    * Path and reachability queries expand frontiers through the bipartite matrix,
+      so the actor x actor adjacency never has to be materialized
+
+    Parameters
+    ------------
+    jobs : pandas.core.frame.DataFrame, optional
+        Output of a jobs search, e.g. makequery_board_affiliations + go_past_1000.
+    investments : pandas.core.frame.DataFrame, optional
+        Output of an investments search, e.g. makequery_investors + go_past_1000.
+    current_only : bool, default=False
+        Only keep board affiliations where is_current is True or missing.
+
+    Attributes
+    ------------
+    actors, companies : pandas.Index
+        Node ids in matrix order.
+    actor_labels, company_labels : dict
+        {node id:name}
+    board : scipy.sparse.csr_matrix
+        actor x company, 1 where the actor holds a board role at the company
+    invest : scipy.sparse.csr_matrix
+        actor x company, 1 where the actor invested in the company
+    affiliation : scipy.sparse.csr_matrix
+        actor x company, 1 where the actor is affiliated either way
+    '''
+    def __init__(self, jobs=None, investments=None, current_only=False):
+        frames = []
+        if jobs is not None:
+            renamed = jobs.rename(column_mapper, axis=1)
+            if current_only and 'is_current' in renamed.columns:
+                renamed = renamed[renamed['is_current'].isna() | (renamed['is_current'] == True)]
+            frames.append(to_edges(renamed, 'person_uuid', 'person').assign(kind='board'))
+        if investments is not None:
+            frames.append(to_edges(investments, 'investor_uuid', 'investor_name').assign(kind='invest'))
+        if not frames:
+            raise ValueError('AffiliationGraph needs a jobs and/or an investments dataframe')
+        edges = pd.concat(frames, ignore_index=True)
+        # Number the nodes
+        actor_idx, self.actors = pd.factorize(edges['actor'])
+        company_idx, self.companies = pd.factorize(edges['company'])
+        actor_names = edges.drop_duplicates('actor', keep='last')
+        company_names = edges.drop_duplicates('company', keep='last')
+        self.actor_labels = dict(zip(actor_names['actor'], actor_names['actor_name']))
+        self.company_labels = dict(zip(company_names['company'], company_names['company_name']))
+        self._actor_pos = {a:i for i, a in enumerate(self.actors)}
+        shape = (len(self.actors), len(self.companies))
+        # Binary bipartite matrices (duplicate edges collapse to 1)
+        def matrix(mask):
+            m = sparse.csr_matrix((np.ones(mask.sum()), (actor_idx[mask], company_idx[mask])), shape=shape)
+            m.data[:] = 1
+            return m
+        kind = edges['kind'].to_numpy()
+        self.board = matrix(kind == 'board')
+        self.invest = matrix(kind == 'invest')
+        self.affiliation = matrix(np.ones(len(edges), dtype=bool))
+        self._by_company = self.affiliation.T.tocsr()
+
+    def actor_id(self, actor):
+        '''
+        Return the matrix row of an actor given by uuid or name.
+        '''
+        if actor in self._actor_pos:
+            return self._actor_pos[actor]
+        for node, pos in self._actor_pos.items():
+            if self.actor_labels.get(node) == actor:
+                return pos
+        raise KeyError("There's no one in this graph by that name or uuid: {}".format(actor))
+
+    def co_board_adjacency(self):
+        '''
+        actor x actor sparse matrix counting the boards two people share (diagonal removed).
+        '''
+        return self._without_diagonal(self.board @ self.board.T)
+
+    def co_investment_adjacency(self):
+        '''
+        actor x actor sparse matrix counting the portfolio companies two investors share (diagonal removed).
+        '''
+        return self._without_diagonal(self.invest @ self.invest.T)
+
+    def company_adjacency(self, kind='all'):
+        '''
+        company x company sparse matrix counting shared board members ('board'), investors ('invest') or both ('all').
+        '''
+        m = {'board':self.board, 'invest':self.invest, 'all':self.affiliation}[kind]
+        return self._without_diagonal(m.T @ m)
+
+    @staticmethod
+    def _without_diagonal(m):
+        m = (m - sparse.diags(m.diagonal())).tocsr()
+        m.eliminate_zeros()
+        return m
+
+    def within_k_hops(self, source, k=2):
+        '''
+        Return every actor reachable from source in at most k hops, where one hop is a shared company.
+
+        Return
+        ------------
+        hops : pandas.Series
+            {actor name:number of hops}, sorted by hops
+        '''
+        start = self.actor_id(source)
+        dist = np.full(len(self.actors), -1)
+        dist[start] = 0
+        frontier = np.zeros(len(self.actors))
+        frontier[start] = 1
+        for hop in range(1, k+1):
+            # actors -> companies -> actors, as two sparse matrix-vector products
+            reached = self.affiliation @ (self.affiliation.T @ frontier)
+            new = (reached > 0) & (dist < 0)
+            if not new.any():
+                break
+            dist[new] = hop
+            frontier = new.astype(float)
+        found = np.flatnonzero(dist > 0)
+        hops = pd.Series(dist[found], index=[self.actor_labels[self.actors[i]] for i in found], name='hops')
+        return hops.sort_values(kind='stable')
+
+    def path_to(self, source, target, k=4):
+        '''
+        Shortest chain of shared companies from source to target, e.g. 'how do we get to this board member?'
+
+        Parameters
+        ------------
+        source, target : str
+            uuid or name of a person/investor.
+        k : int, default=4
+            Maximum number of hops.
+
+        Return
+        ------------
+        path : list
+            [source, company, person, company, ..., target] as names, or [] if target is more than k hops away.
+        '''
+        start, goal = self.actor_id(source), self.actor_id(target)
+        if start == goal:
+            return [self.actor_labels[self.actors[start]]]
+        indptr, indices = self.affiliation.indptr, self.affiliation.indices
+        c_indptr, c_indices = self._by_company.indptr, self._by_company.indices
+        # Breadth-first search over the bipartite graph, remembering how each actor was reached
+        parent = {start:None}
+        seen_companies = set()
+        queue = deque([(start, 0)])
+        while queue:
+            actor, depth = queue.popleft()
+            if depth == k:
+                continue
+            for company in indices[indptr[actor]:indptr[actor+1]]:
+                if company in seen_companies:
+                    continue
+                seen_companies.add(company)
+                for neighbor in c_indices[c_indptr[company]:c_indptr[company+1]]:
+                    if neighbor in parent:
+                        continue
+                    parent[neighbor] = (actor, company)
+                    if neighbor == goal:
+                        return self._unwind(parent, goal)
+                    queue.append((neighbor, depth+1))
+        return []
+
+    def _unwind(self, parent, node):
+        path = [self.actor_labels[self.actors[node]]]
+        while parent[node] is not None:
+            node, company = parent[node]
+            path = [self.actor_labels[self.actors[node]], self.company_labels[self.companies[company]]]+path
+        return path
+
+    def centrality(self, kind='degree', top=20, iterations=100, tol=1e-8):
+        '''
+        Rank actors by centrality in the co-affiliation graph.
+
+        Parameters
+        ------------
+        kind : str, default='degree'
+            * 'degree': number of companies the actor is affiliated with
+            * 'reach': number of distinct actors sharing at least one company
+            * 'eigenvector': eigenvector centrality of the co-affiliation graph (no self-loops), by power iteration
+        top : int, default=20
+            Number of actors to return. None returns all.
+
+        Return
+        ------------
+        ranking : pandas.Series
+            {actor name:score}, highest first
+        '''
+        a = self.affiliation
+        if kind == 'degree':
+            scores = np.asarray(a.sum(axis=1)).ravel()
+        elif kind == 'reach':
+            co = a @ a.T
+            scores = np.diff(co.indptr) - (co.diagonal() > 0)
+        elif kind == 'eigenvector':
+            # Co-affiliation graph without self-loops: an actor's own affiliation count is not an edge
+            co = self._without_diagonal(a @ a.T)
+            # x <- (C + I) x: same eigenvectors as C, and no oscillation on bipartite components
+            scores = np.ones(a.shape[0])/a.shape[0]
+            for _ in range(iterations):
+                nxt = co @ scores + scores
+                nxt /= np.linalg.norm(nxt) or 1
+                if np.abs(nxt-scores).sum() < tol:
+                    scores = nxt
+                    break
+                scores = nxt
+        else:
+            raise ValueError("kind must be 'degree', 'reach' or 'eigenvector'")
+        ranking = pd.Series(scores, index=[self.actor_labels[actor] for actor in self.actors], name=kind)
+        ranking = ranking.sort_values(ascending=False, kind='stable')
+        return ranking if top is None else ranking.head(top)
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from p1_cache import canonicalize
+from p1_queries import add_updated_since
+from p1_crunchbase import go_past_1000
+from p1_lazy import LazyModule
+
+# pandas is imported on first use
+pd = LazyModule('pandas')
+
+class SnapshotStore:
+    '''
+    Directory of previous search results and their `updated_at` high-water marks, one pair per query.
+    * <key>.pkl holds the merged results, <key>.json the high-water mark and row count
+
+    Parameters
+    ------------
+    directory : str, default='snapshots'
+        Where snapshots are written.
+    '''
+    def __init__(self, directory='snapshots'):
+        self.directory = directory
+
+    @staticmethod
+    def key(query, query_type):
+        '''
+        Return a stable key for a search, ignoring the pagination cursor and page size.
+        '''
+        query = {k:v for k, v in query.items() if k not in ('after_id', 'limit')}
+        blob = json.dumps([query_type, canonicalize(query)], sort_keys=True, separators=(',', ':'))
+        return query_type+'-'+hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+    def load(self, key):
+        '''
+        Return (snapshot, high_water_mark), or (None, None) if the query has never been pulled.
+        '''
+        meta_path = os.path.join(self.directory, key+'.json')
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        return pd.read_pickle(os.path.join(self.directory, key+'.pkl')), meta['high_water_mark']
+
+    def save(self, key, snapshot, high_water_mark):
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot.to_pickle(os.path.join(self.directory, key+'.pkl'))
+        # Write the metadata last: a snapshot only counts once its high-water mark is on disk
+        with open(os.path.join(self.directory, key+'.json.tmp'), 'w') as f:
+            json.dump({'high_water_mark':high_water_mark, 'rows':len(snapshot)}, f)
+        os.replace(os.path.join(self.directory, key+'.json.tmp'), os.path.join(self.directory, key+'.json'))
+
+def high_water_mark(raw, previous=None):
+    '''
+    Return the most recent updated_at of a pull, or previous if it has none later (ISO timestamps sort as strings).
+    '''
+    marks = [previous] if previous is not None else []
+    if 'properties.updated_at' in raw.columns and raw['properties.updated_at'].notna().any():
+        marks.append(raw['properties.updated_at'].dropna().max())
+    return max(marks) if marks else None
+
+def incremental_sharded_search(make_query, uuid_lst, query_type, store, shard_size=100, workers=4, full=False,
+                               verbose=True, checkpoint=None, key_column='properties.organization_identifier.uuid'):
+    '''
+    Return the full results of a search over many companies, keeping one snapshot per company.
+    * Snapshots are keyed by make_query([uuid]), so they do not depend on which other companies are in the
+      input or in what order: adding a company only pulls that company in full
+    * Companies are sharded in sorted order. In each shard, companies without a snapshot are pulled in full and
+      the others with one `updated_at` `gte` query at the oldest of their high-water marks (skipping the cache)
+    * Results are split back by key_column and merged into each company's snapshot by uuid (newer rows win)
+    * A company's new high-water mark is the latest updated_at of the pull it was part of: every record updated
+      after that pull is later than it, so the next delta still finds it
+    * A company with no records still gets a high-water mark (the pull's latest updated_at, or the time the pull
+      started if it returned nothing), so the next run asks it for a delta instead of pulling it in full again
+
+    Parameters
+    ------------
+    make_query : function
+        Query builder taking a uuid list, e.g. makequery_board_affiliations, makequery_investors.
+    uuid_lst : list
+        Company uuids.
+    query_type : str
+        One of the types of accepted Crunchbase API searches, e.g. jobs, investments
+    store : SnapshotStore
+        Where snapshots and high-water marks are kept.
+    shard_size : int, default=100
+        Number of uuids per query.
+    workers : int, default=4
+        Maximum number of shards paged at the same time.
+    full : bool, default=False
+        Ignore the snapshots and pull everything.
+    verbose : bool, default=True
+        Print how many records were fetched.
+    checkpoint : RunCheckpoint, optional
+        Checkpoint the pages of the pulls to a run directory and resume from it (see iter_search).
+    key_column : str, default='properties.organization_identifier.uuid'
+        Column holding the company uuid of each record.
+
+    Return
+    ------------
+    raw : pandas.core.frame.DataFrame
+        Normalized results of every company, in input order, same columns as go_past_1000.
+    '''
+    keys = {u:store.key(make_query([u]), query_type) for u in uuid_lst}
+    snapshots, marks = {}, {}
+    if not full:
+        for u in keys:
+            snapshot, since = store.load(keys[u])
+            if snapshot is not None and since is not None:
+                snapshots[u], marks[u] = snapshot, since
+    ordered = sorted(keys)
+    shards = [ordered[i:i+shard_size] for i in range(0, len(ordered), shard_size)]
+
+    def pull(shard):
+        # Returns {uuid:merged snapshot} and the number of records fetched
+        new = [u for u in shard if u not in marks]
+        known = [u for u in shard if u in marks]
+        started = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        pulls = []
+        if new:
+            pulls.append((new, go_past_1000(make_query(new), query_type, None, pd.DataFrame(), checkpoint=checkpoint)))
+        if known:
+            since = min(marks[u] for u in known)
+            pulls.append((known, go_past_1000(add_updated_since(make_query(known), since), query_type, None,
+                                              pd.DataFrame(), checkpoint=checkpoint, fresh=True)))
+        merged, fetched = {}, 0
+        for companies, raw in pulls:
+            fetched += len(raw)
+            groups = dict(tuple(raw.groupby(key_column, sort=False))) if not raw.empty else {}
+            for u in companies:
+                parts = [frame for frame in (snapshots.get(u), groups.get(u)) if frame is not None and not frame.empty]
+                result = pd.concat(parts, ignore_index=True).drop_duplicates('uuid', keep='last').reset_index(drop=True) \
+                         if parts else pd.DataFrame()
+                store.save(keys[u], result, high_water_mark(raw, marks.get(u)) or started)
+                merged[u] = result
+        return merged, fetched
+
+    merged, fetched = {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for shard_merged, shard_fetched in executor.map(pull, shards):
+            merged.update(shard_merged)
+            fetched += shard_fetched
+    frames = [merged[u] for u in keys if not merged[u].empty]
+    raw = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if verbose:
+        print('[{}: fetched {} records, {} of {} companies pulled in full, {} in snapshots]'.format(
+              query_type, fetched, len(keys)-len(marks), len(keys), len(raw)))
+    return raw
@@ -0,0 +1,27 @@
+import importlib
+
+class LazyModule:
+    '''
+    Stand-in for a heavy module (pandas, requests) that imports it on first attribute access.
+    * `pd = LazyModule('pandas')` at the top of a module costs nothing; `pd.DataFrame(...)` imports pandas
+      the first time it runs
+    * Concurrent first uses are safe: the import system locks the module while it is being imported
+
+    Parameters
+    ------------
+    name : str
+        Module to import.
+    '''
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # Only called for attributes missing from the instance, i.e. everything but _name and _module
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded yet'
+        return '<lazy module {!r} ({})>'.format(self._name, state)
@@ -0,0 +1,217 @@
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets
+latency_buckets = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+def endpoint_name(endpoint):
+    '''
+    Group endpoints by type: 'entities/people/<uuid>' -> 'entities/people', 'searches/jobs' stays as is.
+    '''
+    parts = endpoint.split('/')
+    return '/'.join(parts[:2]) if parts[0] in ('searches', 'entities') else parts[0]
+
+class Profiler:
+    '''
+    Records where a company_mapper run spends its time.
+    * Stage timings (with the thread they ran on, since the investor pull runs in the background)
+    * Per-endpoint call counts, cache hits, calls saved by single flight, errors, bytes and latencies
+    * urllib3 retries, backoff retries, throttled (429) responses and time spent waiting on the rate limiter
+    * Disabled by default: every record_* call returns immediately until enable() is called
+
+    Attributes
+    ------------
+    enabled : bool
+        Whether anything is recorded.
+    '''
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.stages = []
+            self.calls = {}
+            self.events = []
+            self.retries = 0
+            self.backoffs = 0
+            self.throttled = 0
+            self.limiter_wait = 0.0
+
+    def enable(self):
+        '''
+        Start recording, from a clean slate.
+        '''
+        self.reset()
+        self.enabled = True
+
+    def _endpoint(self, endpoint):
+        # Caller holds the lock
+        name = endpoint_name(endpoint)
+        if name not in self.calls:
+            self.calls[name] = {'calls':0, 'cached':0, 'coalesced':0, 'errors':0, 'bytes':0, 'wire_bytes':0,
+                                'latencies':[]}
+        return self.calls[name]
+
+    def _event(self, name, category, start, seconds, **args):
+        # Chrome trace 'complete' event, in microseconds since the profiler started
+        self.events.append({'name':name, 'cat':category, 'ph':'X', 'pid':1, 'tid':threading.get_ident(),
+                            'ts':round((start-self.started)*1e6), 'dur':round(seconds*1e6), 'args':args})
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Time a pipeline stage: `with profiler.stage('board pull'): ...`
+        '''
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter()-start
+            with self._lock:
+                self.stages.append({'stage':name, 'start':start-self.started, 'seconds':seconds,
+                                    'thread':threading.current_thread().name})
+                self._event(name, 'stage', start, seconds)
+
+    def record_call(self, endpoint, start, seconds, status=200, nbytes=0, wire_bytes=None, retries=0):
+        '''
+        Record one HTTP call that started at `start` (time.perf_counter()) and took `seconds`.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['calls'] += 1
+            stats['errors'] += status != 200
+            stats['bytes'] += nbytes
+            stats['wire_bytes'] += nbytes if wire_bytes is None else wire_bytes
+            stats['latencies'].append(seconds)
+            self.retries += retries
+            self.throttled += status == 429
+            self._event(endpoint_name(endpoint), 'call', start, seconds, status=status, bytes=nbytes, retries=retries)
+
+    def record_cached(self, endpoint):
+        '''
+        Record a call answered by the response cache.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self._endpoint(endpoint)['cached'] += 1
+
+    def record_coalesced(self, endpoint):
+        '''
+        Record a call that shared the response of an identical call in flight.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self._endpoint(endpoint)['coalesced'] += 1
+
+    def record_wait(self, seconds):
+        '''
+        Record time spent waiting for a rate limiter token.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.limiter_wait += seconds
+
+    def record_backoff(self, seconds):
+        '''
+        Record one with_backoff retry and its delay.
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.backoffs += 1
+            self._event('backoff', 'retry', time.perf_counter(), seconds)
+
+    @staticmethod
+    def histogram(latencies):
+        '''
+        Return the number of latencies (seconds) falling in each bucket of latency_buckets (ms).
+        '''
+        counts = [0]*len(latency_buckets)
+        for seconds in latencies:
+            counts[bisect.bisect_left(latency_buckets, seconds*1000)] += 1
+        return counts
+
+    @staticmethod
+    def percentile(ordered, q):
+        return ordered[min(len(ordered)-1, int(q*len(ordered)))] if ordered else 0.0
+
+    def report(self):
+        '''
+        Return everything recorded as a JSON-serializable dictionary.
+        '''
+        with self._lock:
+            endpoints = {}
+            every = []
+            for name, stats in sorted(self.calls.items()):
+                ordered = sorted(stats['latencies'])
+                every.extend(ordered)
+                endpoints[name] = {key:value for key, value in stats.items() if key != 'latencies'}
+                endpoints[name].update({'seconds':sum(ordered),
+                                        'mean_ms':1000*sum(ordered)/len(ordered) if ordered else 0.0,
+                                        'p50_ms':1000*self.percentile(ordered, 0.5),
+                                        'p95_ms':1000*self.percentile(ordered, 0.95),
+                                        'max_ms':1000*ordered[-1] if ordered else 0.0,
+                                        'histogram':self.histogram(ordered)})
+            return {'seconds':time.perf_counter()-self.started,
+                    'stages':list(self.stages),
+                    'endpoints':endpoints,
+                    'histogram':{'buckets_ms':[str(b) for b in latency_buckets], 'counts':self.histogram(every)},
+                    'retries':self.retries, 'backoffs':self.backoffs, 'throttled':self.throttled,
+                    'limiter_wait':self.limiter_wait}
+
+    def write(self, path):
+        '''
+        Write the report and a Chrome trace (open in chrome://tracing or ui.perfetto.dev) to one JSON file.
+        '''
+        report = self.report()
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents':events, 'displayTimeUnit':'ms', 'profile':report}, f)
+        return report
+
+    def summary(self, report=None):
+        '''
+        Return a one-screen text summary of the report.
+        '''
+        report = report or self.report()
+        lines = ['PROFILE: {:.2f}s total'.format(report['seconds']), '',
+                 '{:<22} {:>9} {:>9} {:>9}  {}'.format('stage', 'start s', 'seconds', 'share', 'thread')]
+        for stage in report['stages']:
+            lines.append('{:<22} {:>9.2f} {:>9.2f} {:>9.0%}  {}'.format(stage['stage'], stage['start'], stage['seconds'],
+                         stage['seconds']/report['seconds'] if report['seconds'] else 0, stage['thread']))
+        lines += ['', '{:<20} {:>7} {:>7} {:>7} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+                  'endpoint', 'calls', 'cached', 'shared', 'errors', 'MB', 'mean ms', 'p50 ms', 'p95 ms', 'max ms')]
+        for name, stats in report['endpoints'].items():
+            lines.append('{:<20} {:>7} {:>7} {:>7} {:>6} {:>8.2f} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}'.format(
+                         name, stats['calls'], stats['cached'], stats['coalesced'], stats['errors'], stats['wire_bytes']/1e6,
+                         stats['mean_ms'], stats['p50_ms'], stats['p95_ms'], stats['max_ms']))
+        lines += ['', 'urllib3 retries: {}   backoff retries: {}   throttled (429): {}   rate limiter wait: {:.2f}s'.format(
+                  report['retries'], report['backoffs'], report['throttled'], report['limiter_wait']), '']
+        counts = report['histogram']['counts']
+        if sum(counts):
+            lines.append('latency (all calls)')
+            # Only print the range of buckets that were hit
+            first = next(i for i, c in enumerate(counts) if c)
+            last = max(i for i, c in enumerate(counts) if c)
+            for bound, count in zip(latency_buckets[first:last+1], counts[first:last+1]):
+                label = '> {:g} ms'.format(latency_buckets[-2]) if bound == float('inf') else '<= {:g} ms'.format(bound)
+                lines.append('{:>12} {:>7} {}'.format(label, count, '#'*round(40*count/max(counts))))
+        return '\n'.join(lines)
+
+# Profiler shared by the client, the backoff helper and company_mapper's stages
+profiler = Profiler()
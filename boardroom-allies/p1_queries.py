@@ -1,3 +1,5 @@
+import copy
+
 def makequery_investors(uuid_lst, limit=1000):
     '''
     Create query for an investments search: Investors of input companies
@@ -17,7 +19,7 @@ def makequery_investors(uuid_lst, limit=1000):
     '''
     if type(uuid_lst)!=list and type(uuid_lst)==str:
         uuid_lst = [uuid_lst]
-    query = {'field_ids':['name','investor_identifier','organization_identifier','partner_identifiers'],
+    query = {'field_ids':['name','investor_identifier','organization_identifier','partner_identifiers','updated_at'],
              'limit':limit,
              'query':[{'type':'predicate','field_id':'organization_identifier','operator_id':'includes','values':uuid_lst}]
             }
@@ -45,7 +47,7 @@ def makequery_board_affiliations(uuid_lst, limit=1000):
     if type(uuid_lst)!=list and type(uuid_lst)==str:
         uuid_lst = [uuid_lst]
     query = {'field_ids':['entity_def_id','identifier','job_type','name','organization_identifier',
-                            'person_identifier','short_description','is_current','title','uuid'],
+                            'person_identifier','short_description','is_current','title','updated_at','uuid'],
              'query':[{'type':'predicate','field_id':'organization_identifier','operator_id':'includes','values':uuid_lst},
                       {'type':'predicate','field_id':'job_type','operator_id':'not_includes','values':['employee',
                                                                                                        'executive']}],
@@ -115,3 +117,50 @@ def makequery_jobs_exec(uuid_lst, limit=1000):
     {'type': 'predicate','field_id': 'job_type','operator_id': 'not_includes','values': ['employee', 'board_member', 'advisor', 'board_observer']}]
     }
     return query
+
+def makequery_people(uuid_lst, limit=1000):
+    '''
+    Create query for a people search: Primary job title, primary organization, and LinkedIn of input individuals
+    * Person uuid includes list of uuid values (up to 1000 per query)
+
+    Parameters
+    ------------
+    uuid_lst : array_list
+        Input list.
+    limit : int, optional
+        'Limit' paramter. 1000, the default value, is the maximum number of results.
+
+    Return
+    ------------
+    query : dictionary
+        Query as json.
+    '''
+    if type(uuid_lst)!=list and type(uuid_lst)==str:
+        uuid_lst = [uuid_lst]
+    query = {'field_ids':['identifier','primary_job_title','primary_organization','linkedin','uuid'],
+             'limit':limit,
+             'query':[{'type':'predicate','field_id':'uuid','operator_id':'includes','values':uuid_lst}]
+            }
+    return query
+
+def add_updated_since(query, since):
+    '''
+    Return a copy of a search query that only matches records updated at or after `since`
+    * Adds an `updated_at` `gte` predicate
+    * The query needs 'updated_at' in its field_ids to track the next high-water mark
+
+    Parameters
+    ------------
+    query : dictionary
+        Query as json.
+    since : str
+        Timestamp, e.g. the largest `updated_at` of the previous pull ('2021-01-12T15:20:32Z').
+
+    Return
+    ------------
+    query : dictionary
+        Query as json.
+    '''
+    query = copy.deepcopy(query)
+    query['query'] = query['query'] + [{'type':'predicate','field_id':'updated_at','operator_id':'gte','values':[since]}]
+    return query
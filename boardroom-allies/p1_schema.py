@@ -0,0 +1,51 @@
+import importlib.util
+from p1_lazy import LazyModule
+
+# pandas is imported on first use
+pd = LazyModule('pandas')
+
+# Column types of the column_mapper-renamed frames in company_mapper
+# Repeated strings: stored once per distinct value
+category_columns = ['company','person','job_type','title','investor_name','type','partner_name',
+                    'person_title','primary_org']
+# Repeated uuids (one value per person/company/investor, many rows each)
+uuid_category_columns = ['company_uuid','person_uuid','investor_uuid','partner_uuid','primary_org_uuid']
+# Unique uuids (one per row): Arrow strings when pyarrow is installed
+uuid_string_columns = ['uuid']
+# is_current stays an object column: company_mapper.board_frames relies on its True/False/None semantics
+
+def string_dtype():
+    '''
+    Return the compact dtype for unique string columns: Arrow-backed strings if pyarrow is installed, else object.
+    '''
+    if importlib.util.find_spec('pyarrow') is None:
+        return object
+    return 'string[pyarrow]'
+
+def compact_frame(df):
+    '''
+    Cast a column_mapper-renamed affiliations or investments frame to compact types.
+    * Names, job types and round types become categoricals (sorted categories, so sorting is unchanged)
+    * Repeated uuids become categoricals, unique row uuids Arrow strings
+    * is_current is left as is (see company_mapper.board_frames)
+    * Columns not listed in the schema are left untouched
+
+    Parameters
+    ------------
+    df : pandas.core.frame.DataFrame
+        Output of company_mapper.board_affiliations or company_mapper.investments.
+
+    Return
+    ------------
+    df : pandas.core.frame.DataFrame
+        Copy with compact column types.
+    '''
+    df = df.copy()
+    for col in category_columns+uuid_category_columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    dtype = string_dtype()
+    for col in uuid_string_columns:
+        if col in df.columns:
+            df[col] = df[col].astype(dtype)
+    return df
@@ -0,0 +1,144 @@
+import time
+import sqlite3
+import threading
+from p1_lazy import LazyModule
+
+# pandas is imported on first use
+pd = LazyModule('pandas')
+
+# Columns kept per table, named as after column_mapper
+jobs_columns = ['uuid','company_uuid','company','person_uuid','person','job_type','is_current','title','record_last_updated']
+investments_columns = ['company_uuid','company','investor_uuid','investor_name','type','partner_uuid','partner_name']
+
+# SQLite caps the number of parameters per statement
+chunk_size = 900
+
+class AffiliationStore:
+    '''
+    Local SQLite store of the normalized, column_mapper-renamed outputs of company_mapper's stages.
+    * jobs and investments are indexed on company_uuid, person_uuid and investor_uuid
+    * Each company records when its jobs and investments were last pulled, so callers can decide
+      whether the stored data is fresh enough to skip the API
+    * People lookups are stored with their own fetch time
+
+    Parameters
+    ------------
+    path : str, default='affiliations.sqlite'
+        Location of the SQLite file.
+    '''
+    def __init__(self, path='affiliations.sqlite'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (uuid TEXT PRIMARY KEY, company_uuid TEXT, company TEXT, person_uuid TEXT,
+                person TEXT, job_type TEXT, is_current INTEGER, title TEXT, record_last_updated TEXT);
+            CREATE INDEX IF NOT EXISTS jobs_company ON jobs (company_uuid);
+            CREATE INDEX IF NOT EXISTS jobs_person ON jobs (person_uuid);
+            CREATE TABLE IF NOT EXISTS investments (company_uuid TEXT, company TEXT, investor_uuid TEXT, investor_name TEXT,
+                type TEXT, partner_uuid TEXT, partner_name TEXT);
+            CREATE INDEX IF NOT EXISTS investments_company ON investments (company_uuid);
+            CREATE INDEX IF NOT EXISTS investments_investor ON investments (investor_uuid);
+            CREATE TABLE IF NOT EXISTS people (person_uuid TEXT PRIMARY KEY, name TEXT, title TEXT, primary_org TEXT,
+                primary_org_uuid TEXT, linkedin TEXT, fetched_at REAL);
+            CREATE TABLE IF NOT EXISTS companies (company_uuid TEXT, stage TEXT, fetched_at REAL,
+                PRIMARY KEY (company_uuid, stage));
+        ''')
+
+    def _select(self, sql, values, params=()):
+        # Run `sql` (containing a {} placeholder for the IN list) over chunks of values
+        frames = []
+        values = list(values)
+        with self._lock:
+            for i in range(0, len(values), chunk_size):
+                chunk = values[i:i+chunk_size]
+                frames.append(pd.read_sql_query(sql.format(','.join('?'*len(chunk))), self.conn, params=[*params, *chunk]))
+            if not frames:
+                return pd.read_sql_query(sql.format("''"), self.conn, params=list(params))
+        return pd.concat(frames, ignore_index=True)
+
+    def is_fresh(self, company_uuids, stage, max_age):
+        '''
+        Return True if `stage` ('jobs' or 'investments') was pulled for every company within max_age seconds.
+        * max_age=None accepts data of any age, as long as it was pulled once
+        '''
+        fetched = self._select('SELECT company_uuid, fetched_at FROM companies WHERE stage=? AND company_uuid IN ({})',
+                               company_uuids, params=(stage,))
+        fetched = dict(zip(fetched['company_uuid'], fetched['fetched_at']))
+        cutoff = 0 if max_age is None else time.time()-max_age
+        return all(fetched.get(company, -1) >= cutoff for company in company_uuids)
+
+    def _mark(self, company_uuids, stage):
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO companies VALUES (?,?,?)', [(c, stage, now) for c in company_uuids])
+
+    def _replace(self, table, frame, columns, company_uuids, stage):
+        # Replace every stored row of the pulled companies, so records gone from Crunchbase are dropped too
+        rows = frame.reindex(columns=columns).astype(object)
+        rows = rows.where(rows.notna(), None)
+        with self._lock, self.conn:
+            values = list(company_uuids)
+            for i in range(0, len(values), chunk_size):
+                chunk = values[i:i+chunk_size]
+                self.conn.execute('DELETE FROM {} WHERE company_uuid IN ({})'.format(table, ','.join('?'*len(chunk))), chunk)
+            self.conn.executemany('INSERT OR REPLACE INTO {} VALUES ({})'.format(table, ','.join('?'*len(columns))),
+                                  rows.itertuples(index=False, name=None))
+            self._mark(company_uuids, stage)
+
+    def save_jobs(self, aff, company_uuids):
+        '''
+        Store the board affiliations of company_uuids (output of company_mapper.board_affiliations).
+        '''
+        self._replace('jobs', aff, jobs_columns, company_uuids, 'jobs')
+
+    def save_investments(self, investors, company_uuids):
+        '''
+        Store the investments in company_uuids (output of company_mapper.investments).
+        '''
+        self._replace('investments', investors, investments_columns, company_uuids, 'investments')
+
+    def save_people(self, names, titles, orgs, orgs_uuid, linkedin):
+        '''
+        Store the five dictionaries returned by primary_info_bulk / primary_info_of_people.
+        '''
+        now = time.time()
+        rows = [(person, name, titles.get(person), orgs.get(person), orgs_uuid.get(person), linkedin.get(person), now)
+                for person, name in names.items()]
+        with self._lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO people VALUES (?,?,?,?,?,?,?)', rows)
+
+    def jobs(self, company_uuids):
+        '''
+        Return the stored board affiliations of company_uuids, sorted by company name like board_affiliations.
+        '''
+        aff = self._select('SELECT * FROM jobs WHERE company_uuid IN ({})', company_uuids)
+        aff['is_current'] = aff['is_current'].map({1:True, 0:False})
+        return aff.sort_values(['company']).reset_index(drop=True)
+
+    def investments(self, company_uuids):
+        '''
+        Return the stored investments in company_uuids.
+        '''
+        investors = self._select('SELECT * FROM investments WHERE company_uuid IN ({})', company_uuids)
+        return investors.sort_values(['company']).reset_index(drop=True)
+
+    def people(self, person_uuids, max_age=None):
+        '''
+        Return the stored primary info of person_uuids, fetched within max_age seconds.
+
+        Return
+        ------------
+        Same five dictionaries as primary_info_bulk, plus the list of person uuids that were not found (or are stale).
+        '''
+        found = self._select('SELECT * FROM people WHERE person_uuid IN ({})', person_uuids)
+        if max_age is not None:
+            found = found[found['fetched_at'] >= time.time()-max_age]
+        dicts = []
+        for col in ['name','title','primary_org','primary_org_uuid','linkedin']:
+            sub = found[['person_uuid', col]].dropna()
+            dicts.append(dict(zip(sub['person_uuid'], sub[col])))
+        known = set(found['person_uuid'])
+        return (*dicts, [person for person in person_uuids if person not in known])
+
+    def close(self):
+        self.conn.close()
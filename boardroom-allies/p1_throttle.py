@@ -0,0 +1,83 @@
+import time
+import random
+import threading
+from json import JSONDecodeError
+from p1_profile import profiler
+
+class Throttled(Exception):
+    '''
+    Raised when Crunchbase answers with HTTP 429 (usage limit exceeded).
+    '''
+    pass
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket limiting the rate of API calls.
+    * Tokens refill continuously at `rate` per second, up to `capacity`
+    * acquire() blocks until a token is available
+
+    Parameters
+    ------------
+    rate : float, default=200/60
+        Tokens added per second. Crunchbase API keys allow 200 calls per minute.
+    capacity : int, default=10
+        Maximum burst size.
+    '''
+    def __init__(self, rate=200/60, capacity=10):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Take one token, sleeping until one is available.
+        '''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                # Refill tokens for the time elapsed since the last call
+                self.tokens = min(self.capacity, self.tokens + (now-self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1-self.tokens)/self.rate
+            time.sleep(wait)
+
+def with_backoff(func, *args, retries=6, base=1.0, cap=60.0, exceptions=(JSONDecodeError, Throttled), verbose=True, **kwargs):
+    '''
+    Call func(*args, **kwargs), retrying with exponential backoff and jitter when Crunchbase throttles the call.
+    * Crunchbase signals an exceeded usage limit either with HTTP 429 or a non-JSON body
+
+    Parameters
+    ------------
+    func : callable
+        Function making the API call.
+    retries : int, default=6
+        Number of retries before the last exception is raised.
+    base : float, default=1.0
+        Delay in seconds before the first retry. Doubles on every retry.
+    cap : float, default=60.0
+        Maximum delay in seconds.
+    exceptions : tuple
+        Exceptions that count as throttling.
+    verbose : bool, default=True
+        Print a note on every retry.
+
+    Return
+    ------------
+    Return value of func.
+    '''
+    for attempt in range(retries+1):
+        try:
+            return func(*args, **kwargs)
+        except exceptions:
+            if attempt == retries:
+                raise
+            delay = min(cap, base*2**attempt)*random.uniform(0.5, 1)
+            profiler.record_backoff(delay)
+            if verbose:
+                print('[From Crunchbase: Usage limit exceeded. Pause for {:.1f} seconds and continue.]'.format(delay), end=' ')
+            time.sleep(delay)
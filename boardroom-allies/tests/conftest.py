@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The p1_* modules are imported flat, as company_mapper does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
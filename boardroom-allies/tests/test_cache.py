@@ -0,0 +1,27 @@
+from p1_cache import ResponseCache
+
+def stored_bytes(cache):
+    return cache._connect().execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+def test_running_total_follows_inserts_replacements_and_evictions(tmp_path):
+    cache = ResponseCache(str(tmp_path/'cache.sqlite'), max_bytes=25)
+    cache.set('a', 'searches/jobs', 'x'*10)
+    cache.set('b', 'searches/jobs', 'x'*10)
+    cache.set('a', 'searches/jobs', 'x'*5)
+    assert cache._total == stored_bytes(cache) == 15
+    # Over the cap: the least recently used entry goes first
+    cache.set('c', 'searches/jobs', 'x'*12)
+    assert cache.get('b', 'searches/jobs') is None
+    assert cache.get('a', 'searches/jobs') == 'x'*5
+    assert cache._total == stored_bytes(cache) == 17
+
+def test_running_total_is_read_from_an_existing_file(tmp_path):
+    path = str(tmp_path/'cache.sqlite')
+    cache = ResponseCache(path)
+    cache.set('a', 'searches/jobs', 'x'*10)
+    cache.set('b', 'entities/organizations', 'x'*7)
+    reopened = ResponseCache(path)
+    reopened.set('c', 'searches/jobs', 'x'*3)
+    assert reopened._total == 20
+    reopened.clear('searches')
+    assert reopened._total == stored_bytes(reopened) == 7
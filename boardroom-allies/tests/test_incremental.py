@@ -0,0 +1,53 @@
+import pandas as pd
+
+import p1_incremental
+from p1_incremental import SnapshotStore, incremental_sharded_search
+from p1_queries import makequery_investors
+
+def since_of(query):
+    # The updated_at gte value of a delta query, or None for a full pull
+    for predicate in query['query']:
+        if predicate['field_id'] == 'updated_at':
+            return predicate['values'][0]
+    return None
+
+def fake_search(records, calls):
+    def go_past_1000(query, query_type, after_id, raw, checkpoint=None, fresh=False):
+        companies = query['query'][0]['values']
+        since = since_of(query)
+        calls.append((sorted(companies), since))
+        rows = [r for r in records if r['properties.organization_identifier.uuid'] in companies and
+                (since is None or r['properties.updated_at'] >= since)]
+        return pd.DataFrame(rows)
+    return go_past_1000
+
+def test_company_without_records_gets_a_delta_on_the_next_run(tmp_path, monkeypatch):
+    records = [{'uuid':'r1', 'properties.organization_identifier.uuid':'acme',
+                'properties.updated_at':'2021-01-05T00:00:00Z'}]
+    calls = []
+    monkeypatch.setattr(p1_incremental, 'go_past_1000', fake_search(records, calls))
+    store = SnapshotStore(str(tmp_path))
+
+    first = incremental_sharded_search(makequery_investors, ['acme', 'empty'], 'investments', store, verbose=False)
+    assert calls == [(['acme', 'empty'], None)]
+    assert list(first['uuid']) == ['r1']
+    assert store.load(store.key(makequery_investors(['empty']), 'investments'))[1] is not None
+
+    calls.clear()
+    second = incremental_sharded_search(makequery_investors, ['acme', 'empty'], 'investments', store, verbose=False)
+    assert calls == [(['acme', 'empty'], '2021-01-05T00:00:00Z')]
+    assert list(second['uuid']) == ['r1']
+
+def test_empty_pull_marks_companies_with_the_pull_start_time(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(p1_incremental, 'go_past_1000', fake_search([], calls))
+    store = SnapshotStore(str(tmp_path))
+
+    incremental_sharded_search(makequery_investors, ['empty'], 'investments', store, verbose=False)
+    snapshot, mark = store.load(store.key(makequery_investors(['empty']), 'investments'))
+    assert snapshot.empty and mark.endswith('Z')
+
+    calls.clear()
+    raw = incremental_sharded_search(makequery_investors, ['empty'], 'investments', store, verbose=False)
+    assert calls == [(['empty'], mark)]
+    assert raw.empty
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from p1_crunchbase import ParquetSink
+
+def investments_page(uuids, partners, is_current):
+    return pd.DataFrame({'uuid':uuids,
+                         'properties.partner_identifiers':partners,
+                         'properties.is_current':is_current})
+
+def test_columns_null_on_first_page_take_later_types(tmp_path):
+    path = str(tmp_path/'pages.parquet')
+    first = investments_page(['a', 'b'], [None, None], [None, None])
+    second = investments_page(['c', 'd'], [[{'uuid':'p1', 'value':'Partner 1'}], None], [True, False])
+    third = investments_page(['e'], [[{'uuid':'p2', 'value':'Partner 2'}]], [None])
+    with ParquetSink(path) as sink:
+        for page in [first, second, third]:
+            sink.write(page)
+    table = pq.read_table(path)
+    assert sink.rows == 5
+    assert table.column('properties.is_current').to_pylist() == [None, None, True, False, None]
+    assert table.column('properties.partner_identifiers').to_pylist() == \
+        [None, None, [{'uuid':'p1', 'value':'Partner 1'}], None, [{'uuid':'p2', 'value':'Partner 2'}]]
+
+def test_later_pages_are_cast_to_the_file_schema(tmp_path):
+    path = str(tmp_path/'pages.parquet')
+    with ParquetSink(path) as sink:
+        sink.write(investments_page(['a'], [[{'uuid':'p1', 'value':'Partner 1'}]], [True]))
+        # Missing column, all-null column and an extra column on a page written after the file is open
+        sink.write(pd.DataFrame({'uuid':['b'], 'properties.is_current':[None], 'extra':[1]}))
+    table = pq.read_table(path)
+    assert table.column_names == ['uuid', 'properties.partner_identifiers', 'properties.is_current']
+    assert table.column('properties.is_current').to_pylist() == [True, None]
+    assert table.column('properties.partner_identifiers').to_pylist() == [[{'uuid':'p1', 'value':'Partner 1'}], None]
+
+def test_columns_null_on_every_page_are_stored_as_strings(tmp_path):
+    path = str(tmp_path/'pages.parquet')
+    with ParquetSink(path, buffer_rows=2) as sink:
+        sink.write(investments_page(['a', 'b'], [None, None], [None, None]))
+        sink.write(investments_page(['c'], [None], [None]))
+    table = pq.read_table(path)
+    assert table.num_rows == 3
+    assert str(table.schema.field('properties.is_current').type) == 'string'
@@ -0,0 +1,27 @@
+import pytest
+
+import company_mapper
+
+def test_name_map_keeps_names_resolved_before_a_failure(tmp_path, monkeypatch):
+    path = str(tmp_path/'names.json')
+    def autocompletes(name, collection, limit=1, verbose=False):
+        if name == 'Company 5':
+            raise RuntimeError('connection lost')
+        return 'org-'+name[-1], name
+    monkeypatch.setattr(company_mapper, 'autocompletes', autocompletes)
+    names = ['Company {}'.format(i) for i in range(1, 8)]
+    with pytest.raises(RuntimeError):
+        company_mapper.resolve_companies(names, workers=1, name_map_path=path, save_every=2)
+    saved = company_mapper.load_name_map(path)
+    assert sorted(saved) == sorted(company_mapper.normalize_name(n) for n in names[:4])
+
+    # The next run only looks up the names that are still missing
+    looked_up = []
+    def autocompletes(name, collection, limit=1, verbose=False):
+        looked_up.append(name)
+        return 'org-'+name[-1], name
+    monkeypatch.setattr(company_mapper, 'autocompletes', autocompletes)
+    uuid, found_item = company_mapper.resolve_companies(names, workers=1, name_map_path=path, save_every=2)
+    assert looked_up == names[4:]
+    assert uuid == ['org-{}'.format(i) for i in range(1, 8)]
+    assert len(company_mapper.load_name_map(path)) == 7